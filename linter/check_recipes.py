@@ -2,23 +2,48 @@
 """
 Recipe validation script for conan-duckstax repository.
 Validates config.yml, conandata.yml, and conanfile.py files.
+Results of unchanged recipes are reused from a cache.
+Optionally downloads every source archive and verifies its sha256.
 """
 
 import argparse
-import ast
+import functools
 import hashlib
-import re
+import subprocess
 import sys
-import urllib.request
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 import yaml
 
+from schema_validator import STR_TAG, compile_schema, node_line
+
+# Recipe analysis and source cache helpers are shared with scripts/build_packages.py
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+from recipe_analyzer import analyze_recipe  # noqa: E402
+from source_cache import DEFAULT_SOURCE_CACHE, collect_sources, prefetch_sources  # noqa: E402
+from workspace import DEFAULT_CACHE_DIR, JsonCache, git_changed_files  # noqa: E402
+
 # Exit codes
 EXIT_SUCCESS = 0
 EXIT_FAILURE = 1
 
+# libyaml based loader when PyYAML was built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# The linter sources
+LINTER_DIR = Path(__file__).resolve().parent
+
+# yamale-format schemas of config.yml and conandata.yml
+SCHEMAS_DIR = LINTER_DIR / "schemas"
+
+# Bump when validation rules change in a way the linter source hash does
+# not capture (e.g. a change in a dependency)
+VALIDATOR_VERSION = 1
+
 # Colors for output
 class Colors:
     RED = "\033[91m"
@@ -51,179 +76,132 @@ def log_success(message: str):
     print(f"{Colors.GREEN}OK{Colors.RESET} {message}")
 
 
-def validate_config_yml(config_path: Path) -> list[str]:
-    """Validate config.yml structure and content."""
-    errors = []
+@functools.lru_cache(maxsize=None)
+def compose_yaml(path: Path) -> Optional[yaml.Node]:
+    """
+    Parse a YAML file into its node tree (which keeps line numbers), once
+    per file and process. Raises yaml.YAMLError on invalid YAML.
+    The result must not be modified.
+    """
+    with open(path, "rb") as f:
+        return yaml.compose(f, Loader=YAML_LOADER)
 
-    if not config_path.exists():
-        errors.append(f"Missing config.yml")
-        return errors
 
-    try:
-        with open(config_path) as f:
-            config = yaml.safe_load(f)
-    except yaml.YAMLError as e:
-        errors.append(f"Invalid YAML: {e}")
-        return errors
+@functools.lru_cache(maxsize=None)
+def load_schema(name: str):
+    """Compiled validator of schemas/<name>.schema.yml, once per process."""
+    return compile_schema(SCHEMAS_DIR / f"{name}.schema.yml")
 
-    if not config:
-        errors.append("Empty config.yml")
-        return errors
 
-    if "versions" not in config:
-        errors.append("Missing 'versions' key in config.yml")
-        return errors
+def yaml_error_line(error: yaml.YAMLError) -> Optional[int]:
+    mark = getattr(error, "problem_mark", None)
+    return mark.line + 1 if mark is not None else None
 
-    versions = config["versions"]
-    if not isinstance(versions, dict):
-        errors.append("'versions' must be a mapping")
-        return errors
 
-    for version, data in versions.items():
-        # Version must be a string (quoted in YAML)
-        if not isinstance(version, str):
-            errors.append(f"Version '{version}' must be a string (add quotes)")
+def mapping_value(node: Optional[yaml.Node], key: str) -> Optional[yaml.Node]:
+    """Value node of key in a mapping node, or None."""
+    if isinstance(node, yaml.MappingNode):
+        for key_node, value_node in node.value:
+            if key_node.value == key:
+                return value_node
+    return None
 
-        if not isinstance(data, dict):
-            errors.append(f"Version '{version}' entry must be a mapping")
-            continue
 
-        if "folder" not in data:
-            errors.append(f"Version '{version}' missing 'folder' key")
-        elif not isinstance(data["folder"], str):
-            errors.append(f"Version '{version}' folder must be a string")
+def unquoted_versions(node: Optional[yaml.Node], what: str) -> list[tuple[str, Optional[int]]]:
+    """Keys of a mapping node that YAML does not read as strings (1.10 is 1.1)."""
+    if not isinstance(node, yaml.MappingNode):
+        return []
+    return [
+        (f"{what} '{key_node.value}' must be a string (add quotes)", node_line(key_node))
+        for key_node, _ in node.value
+        if key_node.tag != STR_TAG
+    ]
 
-    return errors
 
+def validate_config_yml(config_path: Path) -> list[tuple[str, Optional[int]]]:
+    """Validate config.yml against its schema. Returns list of (error, line)."""
+    if not config_path.exists():
+        return [("Missing config.yml", None)]
 
-def validate_conandata_yml(conandata_path: Path, config_path: Path) -> list[str]:
-    """Validate conandata.yml structure and cross-reference with config.yml."""
-    errors = []
+    try:
+        root = compose_yaml(config_path)
+    except yaml.YAMLError as e:
+        return [(f"Invalid YAML: {e}", yaml_error_line(e))]
+
+    if root is None:
+        return [("Empty config.yml", None)]
 
+    errors = load_schema("config")(root)
+    errors.extend(unquoted_versions(mapping_value(root, "versions"), "Version"))
+    return sorted(errors, key=lambda error: error[1] or 0)
+
+
+def validate_conandata_yml(conandata_path: Path, config_path: Path) -> list[tuple[str, Optional[int]]]:
+    """
+    Validate conandata.yml against its schema and cross-reference it with
+    config.yml. Returns list of (error, line).
+    """
     if not conandata_path.exists():
-        errors.append("Missing conandata.yml")
-        return errors
+        return [("Missing conandata.yml", None)]
 
     try:
-        with open(conandata_path) as f:
-            conandata = yaml.safe_load(f)
+        root = compose_yaml(conandata_path)
     except yaml.YAMLError as e:
-        errors.append(f"Invalid YAML: {e}")
-        return errors
+        return [(f"Invalid YAML: {e}", yaml_error_line(e))]
 
-    if not conandata:
-        errors.append("Empty conandata.yml")
-        return errors
+    if root is None:
+        return [("Empty conandata.yml", None)]
+
+    errors = load_schema("conandata")(root)
+    sources = mapping_value(root, "sources")
+    errors.extend(unquoted_versions(sources, "Source version"))
 
     # Load config.yml versions for cross-reference
     config_versions = set()
     if config_path.exists():
         try:
-            with open(config_path) as f:
-                config = yaml.safe_load(f)
-                if config and "versions" in config:
-                    config_versions = set(config["versions"].keys())
+            versions = mapping_value(compose_yaml(config_path), "versions")
+            if isinstance(versions, yaml.MappingNode):
+                config_versions = {key_node.value for key_node, _ in versions.value}
         except yaml.YAMLError:
             pass
 
-    # Validate sources
-    if "sources" not in conandata:
-        errors.append("Missing 'sources' key in conandata.yml")
-    else:
-        sources = conandata["sources"]
-        if not isinstance(sources, dict):
-            errors.append("'sources' must be a mapping")
-        else:
-            for version, source in sources.items():
-                if not isinstance(version, str):
-                    errors.append(f"Source version '{version}' must be a string (add quotes)")
-
-                if not isinstance(source, dict):
-                    errors.append(f"Source for version '{version}' must be a mapping")
-                    continue
-
-                if "url" not in source:
-                    errors.append(f"Version '{version}' missing 'url'")
-
-                if "sha256" not in source:
-                    errors.append(f"Version '{version}' missing 'sha256'")
-                elif len(source.get("sha256", "")) != 64:
-                    errors.append(f"Version '{version}' sha256 must be 64 characters")
-
-                # Check if version exists in config.yml
-                if config_versions and str(version) not in config_versions:
-                    errors.append(f"Version '{version}' in conandata.yml but not in config.yml")
-
-    # Validate patches (optional)
-    if "patches" in conandata:
-        patches = conandata["patches"]
-        if patches and not isinstance(patches, dict):
-            errors.append("'patches' must be a mapping")
-        elif patches:
-            for version, patch_list in patches.items():
-                if not isinstance(patch_list, list):
-                    errors.append(f"Patches for version '{version}' must be a list")
-                    continue
-
-                for i, patch in enumerate(patch_list):
-                    if not isinstance(patch, dict):
-                        errors.append(f"Patch {i} for version '{version}' must be a mapping")
-                        continue
-
-                    if "patch_file" not in patch:
-                        errors.append(f"Patch {i} for version '{version}' missing 'patch_file'")
+    # Check if versions exist in config.yml
+    if config_versions and isinstance(sources, yaml.MappingNode):
+        for key_node, _ in sources.value:
+            if key_node.value not in config_versions:
+                errors.append((
+                    f"Version '{key_node.value}' in conandata.yml but not in config.yml",
+                    node_line(key_node),
+                ))
 
-    return errors
+    return sorted(errors, key=lambda error: error[1] or 0)
 
 
-def validate_conanfile_py(conanfile_path: Path) -> list[str]:
-    """Validate conanfile.py has required attributes."""
-    errors = []
-
+def validate_conanfile_py(conanfile_path: Path) -> list[tuple[str, Optional[int]]]:
+    """Validate conanfile.py has required attributes. Returns list of (error, line)."""
     if not conanfile_path.exists():
-        errors.append("Missing conanfile.py")
-        return errors
+        return [("Missing conanfile.py", None)]
 
+    # Analyze the AST to check for required attributes
     try:
-        with open(conanfile_path) as f:
-            content = f.read()
+        info = analyze_recipe(conanfile_path)
     except IOError as e:
-        errors.append(f"Cannot read conanfile.py: {e}")
-        return errors
-
-    # Parse AST to check for required attributes
-    try:
-        tree = ast.parse(content)
+        return [(f"Cannot read conanfile.py: {e}", None)]
     except SyntaxError as e:
-        errors.append(f"Python syntax error: {e}")
-        return errors
+        return [(f"Python syntax error: {e}", e.lineno)]
 
-    # Find ConanFile class
-    conan_class = None
-    for node in ast.walk(tree):
-        if isinstance(node, ast.ClassDef):
-            for base in node.bases:
-                if isinstance(base, ast.Name) and base.id == "ConanFile":
-                    conan_class = node
-                    break
-
-    if not conan_class:
-        errors.append("No class inheriting from ConanFile found")
-        return errors
+    if info["class_name"] is None:
+        return [("No class inheriting from ConanFile found", None)]
+
+    errors = []
+    found_attrs = info["attributes"]
 
     # Check required attributes
     required_attrs = ["name", "description", "license", "url"]
-    found_attrs = set()
-
-    for node in conan_class.body:
-        if isinstance(node, ast.Assign):
-            for target in node.targets:
-                if isinstance(target, ast.Name):
-                    found_attrs.add(target.id)
-
     for attr in required_attrs:
         if attr not in found_attrs:
-            errors.append(f"Missing required attribute: {attr}")
+            errors.append((f"Missing required attribute: {attr}", None))
 
     # Check for common typos
     typo_check = {
@@ -235,7 +213,7 @@ def validate_conanfile_py(conanfile_path: Path) -> list[str]:
 
     for typo, correct in typo_check.items():
         if typo in found_attrs:
-            errors.append(f"Possible typo: '{typo}' should be '{correct}'")
+            errors.append((f"Possible typo: '{typo}' should be '{correct}'", found_attrs[typo]))
 
     return errors
 
@@ -256,13 +234,52 @@ def validate_test_package(test_package_path: Path) -> list[str]:
     return errors
 
 
-def validate_recipe(recipe_path: Path) -> tuple[int, int]:
-    """Validate a single recipe. Returns (errors, warnings) count."""
+def verify_sources(recipe_paths: list[Path], cache_dir: Path, jobs: int) -> tuple[int, int]:
+    """
+    Download the sources of all recipes concurrently and verify their sha256.
+    Archives are fetched once per sha256, so a sha256 listed with different
+    urls is reported as a warning. Returns (errors, warnings) count.
+    """
+    print(f"\n{Colors.BLUE}Verifying sources{Colors.RESET} (cache: {cache_dir})")
+
+    # sha256 -> [(conandata_path, version, urls), ...]
+    sources = {}
+    for recipe_path in recipe_paths:
+        conandata_path = recipe_path / "conandata.yml"
+        for version, urls, sha256 in collect_sources(conandata_path):
+            sources.setdefault(sha256.lower(), []).append((conandata_path, version, urls))
+
     errors = 0
     warnings = 0
+    results = prefetch_sources(
+        [(users[0][2], sha256) for sha256, users in sources.items()], cache_dir, jobs,
+    )
+    for sha256, (status, error) in results.items():
+        _, first_version, first_urls = sources[sha256][0]
+        for conandata_path, version, urls in sources[sha256]:
+            name = f"{conandata_path.parent.parent.name}/{version}"
+            if error:
+                log_error(str(conandata_path), f"Version '{version}': {error}")
+                errors += 1
+                continue
+            if urls != first_urls:
+                log_warning(
+                    str(conandata_path),
+                    f"Version '{version}' has the same sha256 as '{first_version}' "
+                    f"but a different url; only {first_urls[0]} was verified",
+                )
+                warnings += 1
+            log_success(f"{name} source verified ({status})")
 
-    package_name = recipe_path.parent.name
-    print(f"\n{Colors.BLUE}Validating{Colors.RESET} {package_name}/{recipe_path.name}")
+    return errors, warnings
+
+
+def validate_recipe(recipe_path: Path) -> list[tuple[str, str, str, Optional[int]]]:
+    """
+    Validate a single recipe without printing anything.
+    Returns list of (level, file, message, line) with level 'error' or 'warning'.
+    """
+    messages = []
 
     config_path = recipe_path.parent / "config.yml"
     conandata_path = recipe_path / "conandata.yml"
@@ -270,24 +287,143 @@ def validate_recipe(recipe_path: Path) -> tuple[int, int]:
     test_package_path = recipe_path / "test_package"
 
     # Validate config.yml
-    for error in validate_config_yml(config_path):
-        log_error(str(config_path), error)
-        errors += 1
+    for error, line in validate_config_yml(config_path):
+        messages.append(("error", str(config_path), error, line))
 
     # Validate conandata.yml
-    for error in validate_conandata_yml(conandata_path, config_path):
-        log_error(str(conandata_path), error)
-        errors += 1
+    for error, line in validate_conandata_yml(conandata_path, config_path):
+        messages.append(("error", str(conandata_path), error, line))
 
     # Validate conanfile.py
-    for error in validate_conanfile_py(conanfile_path):
-        log_error(str(conanfile_path), error)
-        errors += 1
+    for error, line in validate_conanfile_py(conanfile_path):
+        messages.append(("error", str(conanfile_path), error, line))
 
     # Validate test_package
     for error in validate_test_package(test_package_path):
-        log_warning(str(test_package_path), error)
-        warnings += 1
+        messages.append(("warning", str(test_package_path), error, None))
+
+    return messages
+
+
+def find_recipe_dirs(package_dir: Path) -> list[Path]:
+    """Recipe folders (e.g., 'all') of a package, in order."""
+    return [
+        recipe_dir for recipe_dir in sorted(package_dir.iterdir())
+        if recipe_dir.is_dir() and not recipe_dir.name.startswith(".")
+        and (recipe_dir / "conanfile.py").exists()
+    ]
+
+
+def validate_recipes(recipe_dirs: list[Path]) -> list[list]:
+    """
+    Validate several recipe folders of one package, so that files shared by
+    them (config.yml) are parsed once. Returns the messages of each folder.
+    """
+    return [validate_recipe(recipe_dir) for recipe_dir in recipe_dirs]
+
+
+def linter_sources() -> list[Path]:
+    """Files the validation rules come from: the linter, its schemas and the recipe analyzer."""
+    return [
+        *sorted(LINTER_DIR.glob("*.py")),
+        *sorted(SCHEMAS_DIR.glob("*.yml")),
+        SCRIPTS_DIR / "recipe_analyzer.py",
+    ]
+
+
+class LintCache(JsonCache):
+    """
+    On-disk cache of validation results.
+
+    Entries are keyed by a hash of the files a recipe's validation reads
+    (config.yml, conandata.yml, conanfile.py, the test_package file list),
+    linter_sources() and VALIDATOR_VERSION. Entries not used for
+    CACHE_MAX_AGE are evicted on save.
+    """
+
+    FILENAME = "lint-results.json"
+
+    def __init__(self, cache_dir: Path):
+        super().__init__(cache_dir)
+        h = hashlib.sha256(f"{VALIDATOR_VERSION}".encode())
+        for path in linter_sources():
+            h.update(f"\0{path.name}\0".encode() + path.read_bytes())
+        self.linter_hash = h.hexdigest()
+
+    def key(self, recipe_path: Path) -> str:
+        """Hash of everything the validation of recipe_path depends on."""
+        h = hashlib.sha256(self.linter_hash.encode())
+        h.update(str(recipe_path).encode())
+        for path in (recipe_path.parent / "config.yml",
+                     recipe_path / "conandata.yml",
+                     recipe_path / "conanfile.py"):
+            h.update(f"\0{path.name}\0".encode())
+            try:
+                h.update(path.read_bytes())
+            except FileNotFoundError:
+                h.update(b"\0missing")
+
+        test_package_path = recipe_path / "test_package"
+        if test_package_path.is_dir():
+            for path in sorted(test_package_path.rglob("*")):
+                h.update(f"\0test_package/{path.relative_to(test_package_path).as_posix()}".encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[list]:
+        """Return cached messages, or None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        entry["used"] = time.time()
+        return [tuple(message) for message in entry["messages"]]
+
+    def put(self, key: str, messages: list):
+        self.entries[key] = {"used": time.time(), "messages": messages}
+
+
+def changed_recipe_dirs(since: str, recipes_dir: Path) -> Optional[set[Path]]:
+    """
+    Recipe folders touched between the merge base of since and HEAD, and
+    the working tree. A change to config.yml touches every folder of the
+    package. Returns None when the linter itself changed (see
+    linter_sources()), so that every recipe is validated again.
+    Raises subprocess.CalledProcessError if git fails.
+    """
+    root, _, files = git_changed_files(since, recipes_dir)
+    recipes_rel = recipes_dir.resolve().relative_to(root).parts
+    linter_files = {path.resolve() for path in linter_sources()}
+
+    changed = set()
+    for file in files:
+        path = root / file
+        if path.resolve() in linter_files or LINTER_DIR in path.resolve().parents:
+            return None
+        parts = Path(file).parts
+        if parts[:len(recipes_rel)] != recipes_rel or len(parts) < len(recipes_rel) + 2:
+            continue
+        package_dir = recipes_dir / parts[len(recipes_rel)]
+        if parts[len(recipes_rel) + 1] == "config.yml":
+            changed.add(package_dir)
+        else:
+            changed.add(package_dir / parts[len(recipes_rel) + 1])
+    return changed
+
+
+def print_recipe_result(recipe_path: Path, messages: list, cached: bool = False) -> tuple[int, int]:
+    """Print the messages of a validated recipe. Returns (errors, warnings) count."""
+    package_name = recipe_path.parent.name
+    cached_str = " (cached)" if cached else ""
+    print(f"\n{Colors.BLUE}Validating{Colors.RESET} {package_name}/{recipe_path.name}{cached_str}")
+
+    errors = 0
+    warnings = 0
+    for level, file, message, line in messages:
+        if level == "error":
+            log_error(file, message, line)
+            errors += 1
+        else:
+            log_warning(file, message, line)
+            warnings += 1
 
     if errors == 0:
         log_success(f"{package_name} passed validation")
@@ -320,6 +456,49 @@ def main():
         action="store_true",
         help="Treat warnings as errors",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of packages validated in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--changed-only",
+        type=str,
+        default=None,
+        metavar="GIT_REF",
+        help="Only validate recipes changed since this git ref (every recipe "
+             "when the linter itself changed)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the lint result cache (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the lint result cache",
+    )
+    parser.add_argument(
+        "--verify-sources",
+        action="store_true",
+        help="Download all sources and verify their sha256",
+    )
+    parser.add_argument(
+        "--source-cache",
+        type=Path,
+        default=DEFAULT_SOURCE_CACHE,
+        help=f"Cache directory for verified sources (default: {DEFAULT_SOURCE_CACHE})",
+    )
+    parser.add_argument(
+        "--download-jobs",
+        type=int,
+        default=4,
+        help="Number of concurrent downloads with --verify-sources (default: 4)",
+    )
 
     args = parser.parse_args()
 
@@ -342,19 +521,70 @@ def main():
     else:
         packages = sorted(recipes_dir.iterdir())
 
-    for package_dir in packages:
-        if not package_dir.is_dir() or package_dir.name.startswith("."):
-            continue
-
-        # Find recipe folders (e.g., 'all')
-        for recipe_dir in package_dir.iterdir():
-            if not recipe_dir.is_dir() or recipe_dir.name.startswith("."):
-                continue
+    recipe_groups = [
+        find_recipe_dirs(package_dir) for package_dir in packages
+        if package_dir.is_dir() and not package_dir.name.startswith(".")
+    ]
 
-            if (recipe_dir / "conanfile.py").exists():
-                errors, warnings = validate_recipe(recipe_dir)
+    if args.changed_only:
+        try:
+            changed = changed_recipe_dirs(args.changed_only, recipes_dir)
+        except subprocess.CalledProcessError as e:
+            print(f"Error: cannot diff against {args.changed_only}: {e.stderr.strip()}")
+            return EXIT_FAILURE
+        if changed is None:
+            print(f"The linter changed since {args.changed_only}: validating every recipe")
+        else:
+            recipe_groups = [
+                [d for d in group if d in changed or d.parent in changed]
+                for group in recipe_groups
+            ]
+            print(f"Recipes changed since {args.changed_only}: {sum(map(len, recipe_groups))}")
+
+    # Reuse results of unchanged recipes
+    cache = None if args.no_cache else LintCache(args.cache_dir)
+    keys = {}
+    cached = {}
+    if cache:
+        for group in recipe_groups:
+            for recipe_dir in group:
+                keys[recipe_dir] = cache.key(recipe_dir)
+                messages = cache.get(keys[recipe_dir])
+                if messages is not None:
+                    cached[recipe_dir] = messages
+    pending = [[d for d in group if d not in cached] for group in recipe_groups]
+    pending = [group for group in pending if group]
+
+    # Validate in worker processes, print in order as results come in
+    recipe_dirs = []
+    jobs = min(args.jobs, len(pending))
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        results = pool.map(validate_recipes, pending) if pool else map(validate_recipes, pending)
+        for group in recipe_groups:
+            pending_dirs = [d for d in group if d not in cached]
+            fresh = dict(zip(pending_dirs, next(results))) if pending_dirs else {}
+            for recipe_dir in group:
+                if recipe_dir in fresh:
+                    messages = fresh[recipe_dir]
+                    if cache:
+                        cache.put(keys[recipe_dir], messages)
+                else:
+                    messages = cached[recipe_dir]
+                errors, warnings = print_recipe_result(recipe_dir, messages, recipe_dir in cached)
                 total_errors += errors
                 total_warnings += warnings
+                recipe_dirs.append(recipe_dir)
+    finally:
+        if pool:
+            pool.shutdown()
+    if cache:
+        cache.save()
+
+    if args.verify_sources:
+        errors, warnings = verify_sources(recipe_dirs, args.source_cache.resolve(), args.download_jobs)
+        total_errors += errors
+        total_warnings += warnings
 
     # Summary
     print(f"\n{Colors.BLUE}=== Summary ==={Colors.RESET}")
@@ -0,0 +1,282 @@
+"""
+Validation of YAML files against the yamale-format schemas in schemas/.
+
+A schema is compiled once into a tree of closures; validating a document
+only walks the document. Documents are validated as composed YAML nodes
+rather than loaded Python objects, so every violation carries the line it
+was found on and scalar types are taken from the YAML tags ('1.0' is a str,
+1.0 is not).
+
+Supported validators: str, int, num, bool, null, any, enum, regex, list, map
+and include, with the keyword arguments required, none, min, max, key and
+strict. As in yamale, an optional field may be null unless none=False.
+"""
+
+import ast
+import re
+from pathlib import Path
+from typing import Callable, Optional
+
+import yaml
+
+# Resolved YAML tags of plain scalars
+STR_TAG = "tag:yaml.org,2002:str"
+INT_TAG = "tag:yaml.org,2002:int"
+FLOAT_TAG = "tag:yaml.org,2002:float"
+BOOL_TAG = "tag:yaml.org,2002:bool"
+NULL_TAG = "tag:yaml.org,2002:null"
+
+# (message, line) pairs reported by validators
+Errors = list[tuple[str, Optional[int]]]
+
+# check(node, path, errors): validate node, append to errors
+Check = Callable[[yaml.Node, str, Errors], None]
+
+
+class SchemaError(Exception):
+    """The schema itself is malformed."""
+
+
+def node_line(node: Optional[yaml.Node]) -> Optional[int]:
+    """1-based line of a node."""
+    return node.start_mark.line + 1 if node is not None else None
+
+
+def child_path(path: str, key) -> str:
+    """Path of a mapping value or list item, e.g. sources['1.0'].url."""
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", key):
+        return f"{path}.{key}" if path else key
+    return f"{path}['{key}']"
+
+
+def describe(node: yaml.Node) -> str:
+    if node.tag == NULL_TAG:
+        return "null"
+    if isinstance(node, yaml.ScalarNode):
+        return f"'{node.value}'"
+    return "a map" if isinstance(node, yaml.MappingNode) else "a list"
+
+
+def mapping_items(node: yaml.MappingNode, path: str, errors: Errors) -> dict[str, tuple]:
+    """Keys of a mapping node -> (key node, value node), reporting duplicates."""
+    items = {}
+    for key_node, value_node in node.value:
+        key = key_node.value if isinstance(key_node, yaml.ScalarNode) else str(key_node)
+        if key in items:
+            errors.append((f"{child_path(path, key)}: duplicate key", node_line(key_node)))
+        items[key] = (key_node, value_node)
+    return items
+
+
+def _scalar_check(type_name: str, tags: set[str], min_value=None, max_value=None, length=False) -> Check:
+    def check(node, path, errors):
+        if not isinstance(node, yaml.ScalarNode) or node.tag not in tags:
+            errors.append((f"{path}: {describe(node)} is not a {type_name}", node_line(node)))
+            return
+        if min_value is None and max_value is None:
+            return
+        if length:
+            value = len(node.value)
+        else:
+            try:
+                value = float(node.value)
+            except ValueError:
+                return
+        if min_value is not None and value < min_value:
+            limit = f"length {min_value}" if length else str(min_value)
+            errors.append((f"{path}: {describe(node)} is less than {limit}", node_line(node)))
+        if max_value is not None and value > max_value:
+            limit = f"length {max_value}" if length else str(max_value)
+            errors.append((f"{path}: {describe(node)} is greater than {limit}", node_line(node)))
+    return check
+
+
+def _any_check(checks: list[Check]) -> Check:
+    """Pass if one of checks passes; a single check reports its own errors."""
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(node, path, errors):
+        for candidate in checks:
+            candidate_errors = []
+            candidate(node, path, candidate_errors)
+            if not candidate_errors:
+                return
+        errors.append((f"{path}: {describe(node)} does not match any allowed type", node_line(node)))
+    return check
+
+
+class SchemaCompiler:
+    """Compiles the documents of one schema file into a validation function."""
+
+    def __init__(self, includes: dict):
+        self.includes = includes
+        self.compiled_includes = {}
+
+    def compile_mapping(self, schema: dict, strict: bool = True) -> Check:
+        fields = {}
+        for key, value in schema.items():
+            if isinstance(value, dict):
+                fields[str(key)] = (self.compile_mapping(value, strict), True, False)
+            else:
+                fields[str(key)] = self.compile_expression(str(value))
+
+        def check(node, path, errors):
+            if not isinstance(node, yaml.MappingNode):
+                errors.append((f"{path or 'document'}: {describe(node)} is not a map", node_line(node)))
+                return
+            items = mapping_items(node, path, errors)
+            for key, (field_check, required, none) in fields.items():
+                if key not in items:
+                    if required:
+                        errors.append((f"{child_path(path, key)}: required field missing", node_line(node)))
+                    continue
+                value_node = items[key][1]
+                if not required and none and value_node.tag == NULL_TAG:
+                    continue
+                field_check(value_node, child_path(path, key), errors)
+            if strict:
+                for key, (key_node, _) in items.items():
+                    if key not in fields:
+                        errors.append((f"{child_path(path, key)}: unexpected element", node_line(key_node)))
+        return check
+
+    def compile_expression(self, expression: str) -> tuple[Check, bool, bool]:
+        """Compile a validator expression. Returns (check, required, none)."""
+        try:
+            tree = ast.parse(expression.strip(), mode="eval").body
+        except SyntaxError as e:
+            raise SchemaError(f"invalid validator '{expression}': {e}") from e
+        return self.compile_call(tree)
+
+    def compile_call(self, call: ast.expr) -> tuple[Check, bool, bool]:
+        if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+            raise SchemaError(f"expected a validator, got '{ast.unparse(call)}'")
+        name = call.func.id
+        try:
+            kwargs = {kw.arg: ast.literal_eval(kw.value) for kw in call.keywords if kw.arg != "key"}
+        except ValueError as e:
+            raise SchemaError(f"non-literal argument in '{ast.unparse(call)}'") from e
+        required = kwargs.pop("required", True)
+        none = kwargs.pop("none", True)
+
+        if name in ("str", "int", "num", "bool", "null"):
+            tags = {
+                "str": {STR_TAG},
+                "int": {INT_TAG},
+                "num": {INT_TAG, FLOAT_TAG},
+                "bool": {BOOL_TAG},
+                "null": {NULL_TAG},
+            }[name]
+            check = _scalar_check(
+                name, tags, kwargs.get("min"), kwargs.get("max"), length=name == "str",
+            )
+        elif name == "enum":
+            values = {str(ast.literal_eval(arg)) for arg in call.args}
+            check = self._enum_check(values)
+        elif name == "regex":
+            patterns = [re.compile(ast.literal_eval(arg)) for arg in call.args]
+            check = self._regex_check(patterns)
+        elif name == "any":
+            check = _any_check([self.compile_call(arg)[0] for arg in call.args])
+        elif name == "list":
+            item_check = _any_check([self.compile_call(arg)[0] for arg in call.args]) if call.args else None
+            check = self._list_check(item_check, kwargs.get("min"), kwargs.get("max"))
+        elif name == "map":
+            value_check = _any_check([self.compile_call(arg)[0] for arg in call.args]) if call.args else None
+            key_check = None
+            for kw in call.keywords:
+                if kw.arg == "key":
+                    key_check = self.compile_call(kw.value)[0]
+            check = self._map_check(value_check, key_check, kwargs.get("min"), kwargs.get("max"))
+        elif name == "include":
+            check = self._include_check(ast.literal_eval(call.args[0]), kwargs.get("strict", True))
+        else:
+            raise SchemaError(f"unknown validator '{name}'")
+        return check, required, none
+
+    def _enum_check(self, values: set[str]) -> Check:
+        def check(node, path, errors):
+            if not isinstance(node, yaml.ScalarNode) or node.value not in values:
+                errors.append((f"{path}: {describe(node)} not in {sorted(values)}", node_line(node)))
+        return check
+
+    def _regex_check(self, patterns: list) -> Check:
+        def check(node, path, errors):
+            if not isinstance(node, yaml.ScalarNode) or not any(p.match(node.value) for p in patterns):
+                errors.append((f"{path}: {describe(node)} does not match the required pattern", node_line(node)))
+        return check
+
+    def _list_check(self, item_check: Optional[Check], min_len, max_len) -> Check:
+        def check(node, path, errors):
+            if not isinstance(node, yaml.SequenceNode):
+                errors.append((f"{path}: {describe(node)} is not a list", node_line(node)))
+                return
+            if min_len is not None and len(node.value) < min_len:
+                errors.append((f"{path}: fewer than {min_len} items", node_line(node)))
+            if max_len is not None and len(node.value) > max_len:
+                errors.append((f"{path}: more than {max_len} items", node_line(node)))
+            if item_check is not None:
+                for i, item in enumerate(node.value):
+                    item_check(item, child_path(path, i), errors)
+        return check
+
+    def _map_check(self, value_check: Optional[Check], key_check: Optional[Check], min_len, max_len) -> Check:
+        def check(node, path, errors):
+            if not isinstance(node, yaml.MappingNode):
+                errors.append((f"{path}: {describe(node)} is not a map", node_line(node)))
+                return
+            items = mapping_items(node, path, errors)
+            if min_len is not None and len(items) < min_len:
+                errors.append((f"{path}: fewer than {min_len} entries", node_line(node)))
+            if max_len is not None and len(items) > max_len:
+                errors.append((f"{path}: more than {max_len} entries", node_line(node)))
+            for key, (key_node, value_node) in items.items():
+                if key_check is not None:
+                    key_check(key_node, f"{child_path(path, key)} (key)", errors)
+                if value_check is not None:
+                    value_check(value_node, child_path(path, key), errors)
+        return check
+
+    def _include_check(self, name: str, strict: bool) -> Check:
+        if name not in self.includes:
+            raise SchemaError(f"unknown include '{name}'")
+
+        cache_key = (name, strict)
+        if cache_key not in self.compiled_includes:
+            # Placeholder first, so that recursive includes terminate
+            compiled = []
+            self.compiled_includes[cache_key] = lambda node, path, errors: compiled[0](node, path, errors)
+            schema = self.includes[name]
+            if isinstance(schema, dict):
+                compiled.append(self.compile_mapping(schema, strict))
+            else:
+                compiled.append(self.compile_expression(str(schema))[0])
+        return self.compiled_includes[cache_key]
+
+
+def compile_schema(schema_path: Path) -> Callable[[yaml.Node], Errors]:
+    """
+    Compile a yamale-format schema file: the first document is the schema,
+    the following ones define includes.
+    Returns validate(root node) -> list of (message, line).
+    Raises SchemaError if the schema is malformed.
+    """
+    with open(schema_path) as f:
+        documents = list(yaml.safe_load_all(f))
+    if not documents or not isinstance(documents[0], dict):
+        raise SchemaError(f"{schema_path}: first document must be a mapping")
+
+    includes = {}
+    for document in documents[1:]:
+        includes.update(document or {})
+
+    root_check = SchemaCompiler(includes).compile_mapping(documents[0])
+
+    def validate(root: yaml.Node) -> Errors:
+        errors = []
+        root_check(root, "", errors)
+        return errors
+    return validate
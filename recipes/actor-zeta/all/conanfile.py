@@ -66,6 +66,12 @@ class ActorZetaConan(ConanFile):
         tc.variables["RTTI_DISABLE"] = self.options.get_safe("rtti_disable")
         tc.variables["SHARED"] = self.options.get_safe("shared")
         tc.variables["CMAKE_CXX_STANDARD"] = int(str(self.options.cxx_standard))
+        # Optional compiler cache (-c user.duckstax:compiler_launcher=ccache);
+        # a conf rather than an option, so that it does not affect the package_id
+        launcher = self.conf.get("user.duckstax:compiler_launcher", check_type=str)
+        if launcher:
+            tc.cache_variables["CMAKE_C_COMPILER_LAUNCHER"] = launcher
+            tc.cache_variables["CMAKE_CXX_COMPILER_LAUNCHER"] = launcher
         tc.generate()
 
     def build(self):
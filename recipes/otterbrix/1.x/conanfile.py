@@ -3,9 +3,48 @@ from conan.tools.build import check_min_cppstd
 from conan.tools.cmake import CMake, cmake_layout, CMakeDeps, CMakeToolchain
 from conan.tools.files import apply_conandata_patches, export_conandata_patches, copy, get, rmdir, save, load, collect_libs
 import os
+import shutil
 from glob import glob
 
 
+# Included after project() (CMAKE_PROJECT_INCLUDE) when precompiled_headers
+# is enabled: once the top-level CMakeLists.txt is processed, every C++
+# target of the build gets the standard library headers precompiled.
+PRECOMPILED_HEADERS_CMAKE = """\
+include_guard(GLOBAL)
+
+if(CMAKE_VERSION VERSION_LESS 3.19)
+    message(WARNING "precompiled_headers needs CMake 3.19 or newer, ignored")
+    return()
+endif()
+
+function(conan_otterbrix_precompile_headers directory)
+    get_property(targets DIRECTORY "${directory}" PROPERTY BUILDSYSTEM_TARGETS)
+    foreach(target IN LISTS targets)
+        get_target_property(type ${target} TYPE)
+        get_target_property(sources ${target} SOURCES)
+        if(type MATCHES "^(STATIC_LIBRARY|SHARED_LIBRARY|MODULE_LIBRARY|OBJECT_LIBRARY|EXECUTABLE)$"
+           AND sources MATCHES "[.](cpp|cc|cxx)(;|$)")
+            # C++ only: a target with C sources as well gets no C header
+            # ($<ANGLE-R> keeps the ">" from closing the generator expression)
+            set(headers)
+            foreach(header algorithm functional map memory string unordered_map utility vector)
+                list(APPEND headers "$<$<COMPILE_LANGUAGE:CXX>:<${header}$<ANGLE-R>>")
+            endforeach()
+            target_precompile_headers(${target} PRIVATE ${headers})
+        endif()
+    endforeach()
+    get_property(subdirectories DIRECTORY "${directory}" PROPERTY SUBDIRECTORIES)
+    foreach(subdirectory IN LISTS subdirectories)
+        conan_otterbrix_precompile_headers("${subdirectory}")
+    endforeach()
+endfunction()
+
+cmake_language(DEFER DIRECTORY "${CMAKE_SOURCE_DIR}"
+               CALL conan_otterbrix_precompile_headers "${CMAKE_SOURCE_DIR}")
+"""
+
+
 class Otterbrix(ConanFile):
     name = "otterbrix"
     description = "otterbrix is an open-source framework for developing conventional and analytical applications."
@@ -18,11 +57,15 @@ class Otterbrix(ConanFile):
     options = {
         "shared": [True, False],
         "build_python": [True, False],
+        "unity_build": [True, False],
+        "precompiled_headers": [True, False],
     }
 
     default_options = {
         "shared": True,
         "build_python": False,
+        "unity_build": False,
+        "precompiled_headers": False,
         "actor-zeta/*:cxx_standard": 20,
         "actor-zeta/*:fPIC": True,
         "actor-zeta/*:exceptions_disable": False,
@@ -36,6 +79,11 @@ class Otterbrix(ConanFile):
     def validate(self):
         check_min_cppstd(self, 20)
 
+    def package_id(self):
+        # Build speed only: the same binary either way
+        del self.info.options.unity_build
+        del self.info.options.precompiled_headers
+
     def requirements(self):
         self.requires("boost/1.88.0")
         self.requires("fmt/11.1.3")
@@ -58,9 +106,25 @@ class Otterbrix(ConanFile):
         apply_conandata_patches(self)
 
     def generate(self):
-        tc = CMakeToolchain(self)
+        # Ninja when available, unless tools.cmake.cmaketoolchain:generator says otherwise
+        generator = self.conf.get("tools.cmake.cmaketoolchain:generator")
+        if generator is None and shutil.which("ninja"):
+            generator = "Ninja"
+        tc = CMakeToolchain(self, generator=generator)
         tc.variables["CMAKE_CXX_STANDARD"] = "20"
         tc.variables["BUILD_PYTHON"] = bool(self.options.build_python)
+        if self.options.unity_build:
+            tc.cache_variables["CMAKE_UNITY_BUILD"] = True
+        if self.options.precompiled_headers:
+            pch_cmake = os.path.join(self.generators_folder, "otterbrix_precompiled_headers.cmake")
+            save(self, pch_cmake, PRECOMPILED_HEADERS_CMAKE)
+            tc.cache_variables["CMAKE_PROJECT_INCLUDE"] = pch_cmake.replace("\\", "/")
+        # Optional compiler cache (-c user.duckstax:compiler_launcher=ccache);
+        # a conf rather than an option, so that it does not affect the package_id
+        launcher = self.conf.get("user.duckstax:compiler_launcher", check_type=str)
+        if launcher:
+            tc.cache_variables["CMAKE_C_COMPILER_LAUNCHER"] = launcher
+            tc.cache_variables["CMAKE_CXX_COMPILER_LAUNCHER"] = launcher
         tc.generate()
 
         deps = CMakeDeps(self)
@@ -0,0 +1,266 @@
+"""
+History of package builds.
+
+Every build run by scripts/build_packages.py is recorded in a small SQLite
+database in the cache directory: duration, exit status, peak memory and
+compile jobs per package, version, profile and build type. The history
+drives the scheduler (estimated durations for longest-job-first ordering
+and balanced shards, memory per compile job) and the `report` subcommand,
+which shows the trend of every configuration and flags regressions.
+Databases written on several machines (CI shards) are combined with
+BuildHistory.merge().
+"""
+
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_DB_NAME = "build-history.sqlite"
+
+# Builds older than this are dropped
+HISTORY_MAX_AGE = 180 * 24 * 3600
+
+# Successful builds an estimate is taken from (median), most recent first
+ESTIMATE_WINDOW = 5
+
+# Successful builds the last one is compared with by the report
+TREND_WINDOW = 10
+MIN_TREND_SAMPLES = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    finished REAL NOT NULL,
+    package TEXT NOT NULL,
+    version TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    build_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL,
+    peak_rss INTEGER,
+    jobs INTEGER
+);
+CREATE INDEX IF NOT EXISTS builds_configuration
+    ON builds (package, profile, build_type, version, finished);
+"""
+
+
+class BuildHistory:
+    """
+    The build history database at path. A database that cannot be opened
+    is reported once and then behaves as an empty, read-only history.
+    Not thread-safe: use from one thread.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.db = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.executescript(SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: build history {path} not available: {e}", file=sys.stderr)
+            self.db = None
+
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        if self.db is None:
+            return []
+        try:
+            return self.db.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Warning: build history query failed: {e}", file=sys.stderr)
+            return []
+
+    def record(self, builds: list[dict]):
+        """
+        Add finished builds, each a dict with 'package', 'version',
+        'profile', 'build_type', 'status', 'duration', 'peak_rss' and
+        'jobs' keys, and drop the ones older than HISTORY_MAX_AGE.
+        """
+        if self.db is None or not builds:
+            return
+        now = time.time()
+        try:
+            with self.db:
+                self.db.executemany(
+                    "INSERT INTO builds (finished, package, version, profile, build_type,"
+                    " status, duration, peak_rss, jobs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (now, b["package"], b["version"], b["profile"], b["build_type"],
+                         b["status"], b["duration"], b["peak_rss"], b["jobs"])
+                        for b in builds
+                    ],
+                )
+                self.db.execute("DELETE FROM builds WHERE finished < ?", (now - HISTORY_MAX_AGE,))
+        except sqlite3.Error as e:
+            print(f"Warning: failed to record build history: {e}", file=sys.stderr)
+
+    def merge(self, path: Path) -> int:
+        """
+        Add the builds of another history database that are not in this
+        one yet (rows are only ever appended, so a build is identified by
+        its configuration and finish time). Returns the number added.
+        """
+        if self.db is None:
+            return 0
+        before = self.db.total_changes
+        try:
+            self.db.execute("ATTACH DATABASE ? AS other", (str(path),))
+            try:
+                with self.db:
+                    self.db.execute(
+                        "INSERT INTO builds (finished, package, version, profile, build_type,"
+                        " status, duration, peak_rss, jobs)"
+                        " SELECT finished, package, version, profile, build_type,"
+                        " status, duration, peak_rss, jobs FROM other.builds AS o"
+                        " WHERE NOT EXISTS (SELECT 1 FROM builds AS b WHERE"
+                        " b.finished = o.finished AND b.package = o.package AND b.version = o.version"
+                        " AND b.profile = o.profile AND b.build_type = o.build_type)"
+                    )
+            finally:
+                self.db.execute("DETACH DATABASE other")
+        except sqlite3.Error as e:
+            print(f"Warning: failed to merge build history {path}: {e}", file=sys.stderr)
+        return self.db.total_changes - before
+
+    def estimate(self, package: str, version: str, profile: str, build_type: str) -> Optional[float]:
+        """
+        Expected duration of a build in seconds: the median of the last
+        successful builds of the same configuration, else of other versions
+        of the package with the same profile and build type, else of any
+        build of the package. None if it was never built.
+        """
+        for where, params in (
+            ("package = ? AND profile = ? AND build_type = ? AND version = ?",
+             (package, profile, build_type, version)),
+            ("package = ? AND profile = ? AND build_type = ?", (package, profile, build_type)),
+            ("package = ?", (package,)),
+        ):
+            rows = self._query(
+                f"SELECT duration FROM builds WHERE {where} AND status = 'succeeded'"
+                " AND duration IS NOT NULL ORDER BY finished DESC LIMIT ?",
+                (*params, ESTIMATE_WINDOW),
+            )
+            if rows:
+                return statistics.median(row[0] for row in rows)
+        return None
+
+    def peak_rss(self, package: str) -> Optional[int]:
+        """Largest peak RSS (bytes) of the last successful builds of a package."""
+        rows = self._query(
+            "SELECT MAX(peak_rss) FROM (SELECT peak_rss FROM builds WHERE package = ?"
+            " AND status = 'succeeded' AND peak_rss IS NOT NULL ORDER BY finished DESC LIMIT ?)",
+            (package, TREND_WINDOW),
+        )
+        return rows[0][0] if rows and rows[0][0] else None
+
+    def configurations(self, package: Optional[str] = None) -> list[tuple[str, str, str, str]]:
+        """(package, version, profile, build_type) of every recorded configuration."""
+        sql = "SELECT DISTINCT package, version, profile, build_type FROM builds"
+        params = ()
+        if package:
+            sql += " WHERE package = ?"
+            params = (package,)
+        return self._query(sql + " ORDER BY package, version, profile, build_type", params)
+
+    def builds(self, package: str, version: str, profile: str, build_type: str,
+               limit: int) -> list[dict]:
+        """The last builds of a configuration, most recent first."""
+        rows = self._query(
+            "SELECT finished, status, duration, peak_rss, jobs FROM builds"
+            " WHERE package = ? AND version = ? AND profile = ? AND build_type = ?"
+            " ORDER BY finished DESC LIMIT ?",
+            (package, version, profile, build_type, limit),
+        )
+        return [
+            {"finished": r[0], "status": r[1], "duration": r[2], "peak_rss": r[3], "jobs": r[4]}
+            for r in rows
+        ]
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def trend(builds: list[dict], threshold: float) -> dict:
+    """
+    Compare the last build of a configuration (builds most recent first)
+    with the median of the successful builds before it.
+    Returns dict with 'runs', 'failures', 'last' (the last build), 'median'
+    duration and 'median_rss' before it (None with fewer than
+    MIN_TREND_SAMPLES), and 'regressions' (descriptions, empty if none).
+    """
+    last = builds[0]
+    before = [b for b in builds[1:] if b["status"] == "succeeded"]
+    durations = [b["duration"] for b in before if b["duration"] is not None]
+    rss = [b["peak_rss"] for b in before if b["peak_rss"] is not None]
+    result = {
+        "runs": len(builds),
+        "failures": sum(1 for b in builds if b["status"] != "succeeded"),
+        "last": last,
+        "median": statistics.median(durations) if len(durations) >= MIN_TREND_SAMPLES else None,
+        "median_rss": statistics.median(rss) if len(rss) >= MIN_TREND_SAMPLES else None,
+        "regressions": [],
+    }
+
+    if last["status"] != "succeeded":
+        result["regressions"].append(f"last build {last['status']}")
+        return result
+    if result["median"] and last["duration"] and last["duration"] > result["median"] * threshold:
+        result["regressions"].append(
+            f"duration +{100 * (last['duration'] / result['median'] - 1):.0f}%")
+    if result["median_rss"] and last["peak_rss"] and last["peak_rss"] > result["median_rss"] * threshold:
+        result["regressions"].append(
+            f"peak memory +{100 * (last['peak_rss'] / result['median_rss'] - 1):.0f}%")
+    return result
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(round(seconds), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def print_report(history: BuildHistory, package: Optional[str] = None,
+                 limit: int = TREND_WINDOW, threshold: float = 1.2) -> int:
+    """
+    Print the recent builds of every configuration: last duration against
+    the median before it, peak memory, failures and the trend of the
+    durations (oldest to newest). Returns the number of regressions.
+    """
+    rows = []
+    for configuration in history.configurations(package):
+        builds = history.builds(*configuration, limit=limit + 1)
+        if builds:
+            rows.append((configuration, trend(builds, threshold)))
+    if not rows:
+        print(f"No builds recorded in {history.path}")
+        return 0
+
+    width = max(len(f"{p}/{v} [{pr}] {bt}") for (p, v, pr, bt), _ in rows)
+    print(f"{'configuration':<{width}}  {'last':>8}  {'median':>8}  {'peak MiB':>8}  "
+          f"{'runs':>4}  {'fail':>4}  trend")
+    regressions = 0
+    for (pkg, version, profile, build_type), result in rows:
+        last = result["last"]
+        durations = [
+            format_duration(b["duration"]) if b["status"] == "succeeded" else b["status"]
+            for b in reversed(history.builds(pkg, version, profile, build_type, limit))
+        ]
+        rss = f"{last['peak_rss'] / (1024 * 1024):.0f}" if last["peak_rss"] else "-"
+        finished = datetime.fromtimestamp(last["finished"], timezone.utc).strftime("%Y-%m-%d")
+        print(f"{f'{pkg}/{version} [{profile}] {build_type}':<{width}}  "
+              f"{format_duration(last['duration']):>8}  {format_duration(result['median']):>8}  "
+              f"{rss:>8}  {result['runs']:>4}  {result['failures']:>4}  "
+              f"{' '.join(durations)} ({finished})")
+        if result["regressions"]:
+            regressions += 1
+            print(f"  ! regression: {', '.join(result['regressions'])}")
+    return regressions
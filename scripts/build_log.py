@@ -0,0 +1,281 @@
+"""
+Streaming capture of build process output.
+
+Every line a child process writes is appended to a gzip-compressed log
+file as it arrives, so memory stays bounded however much the compiler
+prints; only the last lines are kept (a ring buffer) for failure reports.
+Live output is either prefixed with the build it belongs to, or printed as
+one GitHub Actions ::group:: block per process once it has finished, so
+that the output of parallel builds does not interleave. Conan's
+"<ref>: Invalid: <reason>" lines (ConanInvalidConfiguration) are detected
+while the output streams by; the error a failed process ended with is
+classified as transient (worth a retry) or not.
+
+Running processes are registered, so that terminate_all() can stop every
+build in flight (children run in their own process group, which takes the
+compilers started by Conan and CMake down with them).
+"""
+
+import gzip
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+# Live output modes: prefixed lines, ::group:: blocks, nothing
+OUTPUT_MODES = ("prefix", "group", "quiet")
+
+# Lines kept in memory per process, printed when it fails
+DEFAULT_TAIL_LINES = 50
+
+# Reported by Conan for a configuration raising ConanInvalidConfiguration
+INVALID_LINE = re.compile(r"^(\S+): Invalid: (.*)$")
+
+# Network and timeout errors of downloads (sources through get(), packages
+# from remotes) that may well succeed on the next attempt.
+# Only the error a process failed with is matched: Conan prints the same
+# messages as warnings for downloads it retries and completes by itself.
+TRANSIENT_ERROR = re.compile(
+    r"Error downloading file"
+    r"|HTTPS?ConnectionPool"
+    r"|Max retries exceeded"
+    r"|Connection (refused|reset|aborted)"
+    r"|Read timed out"
+    r"|Temporary failure in name resolution"
+    r"|Name or service not known"
+    r"|\b50[234] (Bad Gateway|Service Unavailable|Gateway Time-?out)",
+    re.IGNORECASE,
+)
+
+# Download errors that no retry fixes: missing files, checksum mismatches
+PERMANENT_ERROR = re.compile(
+    r"\b404\b|Not found|checksum|signature failed",
+    re.IGNORECASE,
+)
+
+# Lines of a failed process searched for its error: from its last "ERROR:"
+# line (Conan continues the message on the next lines), or its last lines
+ERROR_TAIL_LINES = 5
+
+# Serializes live output of concurrent processes
+_output_lock = threading.Lock()
+
+# Processes currently running, for terminate_all()
+_processes = set()
+_processes_lock = threading.Lock()
+
+
+def default_output_mode() -> str:
+    """::group:: blocks on GitHub Actions, prefixed lines elsewhere."""
+    return "group" if os.environ.get("GITHUB_ACTIONS") == "true" else "prefix"
+
+
+def run_logged(
+    cmd: list[str],
+    label: str,
+    log_path: Optional[Path] = None,
+    output: str = "prefix",
+    capture_stdout: bool = False,
+    tail_lines: int = DEFAULT_TAIL_LINES,
+    timeout: Optional[float] = None,
+) -> dict:
+    """
+    Run a command, streaming its output line by line.
+    stderr, and stdout unless capture_stdout, go to the gzip log at log_path
+    (when given) and to the live output; a captured stdout is returned whole
+    (Conan only writes its --format=json result there).
+    The process is killed after timeout seconds.
+    Returns dict with 'returncode', 'stdout', 'peak_rss' (bytes of the
+    process and its waited-for descendants, or None where unavailable),
+    'tail' (last lines), 'invalid' (reason of the first Invalid line, or
+    None), 'transient' (see transient_error(), None unless it failed),
+    'timed_out' and 'log' (log_path) keys.
+    """
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE if capture_stdout else subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        start_new_session=os.name == "posix",
+    )
+    with _processes_lock:
+        _processes.add(proc)
+
+    stdout = []
+    reader = None
+    if capture_stdout:
+        reader = threading.Thread(target=lambda: stdout.append(proc.stdout.read()), daemon=True)
+        reader.start()
+    stream = proc.stderr if capture_stdout else proc.stdout
+
+    timed_out = threading.Event()
+    timer = None
+    if timeout is not None:
+        def kill():
+            timed_out.set()
+            signal_process(proc, signal.SIGKILL if os.name == "posix" else signal.SIGTERM)
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+
+    tail = deque(maxlen=tail_lines)
+    invalid = None
+    log = gzip.open(log_path, "wt", encoding="utf-8") if log_path is not None else None
+    try:
+        for line in stream:
+            line = line.rstrip("\n")
+            if log is not None:
+                log.write(line + "\n")
+            tail.append(line)
+            if invalid is None:
+                m = INVALID_LINE.match(line)
+                if m:
+                    invalid = m.group(2)
+            if output == "prefix":
+                with _output_lock:
+                    print(f"[{label}] {line}", flush=True)
+    finally:
+        if log is not None:
+            log.close()
+        if reader is not None:
+            reader.join()
+        if timer is not None:
+            timer.cancel()
+
+    peak_rss = None
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    else:
+        proc.wait()
+    with _processes_lock:
+        _processes.discard(proc)
+
+    if output == "group":
+        print_group(label, log_path, tail)
+
+    return {
+        "returncode": proc.returncode,
+        "stdout": stdout[0] if stdout else "",
+        "peak_rss": peak_rss,
+        "tail": list(tail),
+        "invalid": invalid,
+        "transient": transient_error(list(tail)) if proc.returncode != 0 else None,
+        "timed_out": timed_out.is_set(),
+        "log": log_path,
+    }
+
+
+def transient_error(tail: list[str]) -> Optional[str]:
+    """
+    The error a failed process ended with, if it is transient: its last
+    "ERROR:" line and the lines after it (or, without one, its last
+    ERROR_TAIL_LINES lines), when they match TRANSIENT_ERROR and not
+    PERMANENT_ERROR. Returns the matching line, or None.
+    """
+    starts = [i for i, line in enumerate(tail) if line.lstrip().startswith("ERROR:")]
+    error = tail[starts[-1]:][:ERROR_TAIL_LINES] if starts else tail[-ERROR_TAIL_LINES:]
+    if any(PERMANENT_ERROR.search(line) for line in error):
+        return None
+    for line in error:
+        if TRANSIENT_ERROR.search(line):
+            return line.strip()
+    return None
+
+
+def signal_process(proc: subprocess.Popen, sig: int):
+    """Send a signal to a process started by run_logged() and its process group."""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, sig)
+        else:
+            proc.terminate()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def terminate_all():
+    """Terminate every process started by run_logged() that is still running."""
+    with _processes_lock:
+        processes = list(_processes)
+    for proc in processes:
+        signal_process(proc, signal.SIGTERM)
+
+
+def print_locked(text: str, file=None):
+    """Print text (possibly several lines) without interleaving it with process output."""
+    with _output_lock:
+        print(text, file=file or sys.stdout, flush=True)
+
+
+def print_group(label: str, log_path: Optional[Path], tail: deque):
+    """Print a finished process' output as a collapsed GitHub Actions group."""
+    with _output_lock:
+        print(f"::group::{label}")
+        if log_path is not None:
+            with gzip.open(log_path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    sys.stdout.write(line)
+        else:
+            for line in tail:
+                print(line)
+        print("::endgroup::", flush=True)
+
+
+def print_tail(label: str, result: dict):
+    """Report a failed process: its last lines and where the full log is."""
+    with _output_lock:
+        print(f"\n{label} failed (exit code {result['returncode']})", file=sys.stderr)
+        if result["tail"]:
+            print(f"--- last {len(result['tail'])} lines ---", file=sys.stderr)
+            for line in result["tail"]:
+                print(f"  {line}", file=sys.stderr)
+        if result["log"] is not None:
+            print(f"--- full log: {result['log']}", file=sys.stderr)
+        sys.stderr.flush()
+
+
+class BuildLogs:
+    """
+    Log settings of a build run: one gzip log per build and phase in
+    log_dir (no files when None) and the live output mode.
+    """
+
+    def __init__(self, log_dir: Optional[Path] = None, output: str = "prefix",
+                 tail_lines: int = DEFAULT_TAIL_LINES):
+        self.log_dir = log_dir
+        self.output = output
+        self.tail_lines = tail_lines
+        if log_dir is not None:
+            log_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str, phase: str) -> Optional[Path]:
+        """Log file of a phase of a build, e.g. otterbrix-1.0.0_cpp20_.create.log.gz."""
+        if self.log_dir is None:
+            return None
+        return self.log_dir / f"{re.sub(r'[^A-Za-z0-9.+-]+', '_', key)}.{phase}.log.gz"
+
+    def run(self, cmd: list[str], key: str, phase: str, capture_stdout: bool = False) -> dict:
+        """
+        Run a build command with its output logged (see run_logged).
+        The tail is printed when it fails, unless the output was already
+        shown line by line.
+        """
+        result = run_logged(
+            cmd, f"{key} {phase}", self.path(key, phase), self.output,
+            capture_stdout=capture_stdout, tail_lines=self.tail_lines,
+        )
+        if result["returncode"] != 0:
+            if self.output == "prefix":
+                if result["log"] is not None:
+                    print_locked(f"{key} {phase} failed, full log: {result['log']}", file=sys.stderr)
+            else:
+                print_tail(f"{key} {phase}", result)
+        return result
@@ -4,26 +4,86 @@ Build all packages in dependency order.
 
 Features:
 - Reads versions from config.yml
-- Gets available options from recipes via conan inspect
-- Parses local dependencies from conanfile.py
+- Reads options and dependencies from conanfile.py with a static AST
+  analysis, once per recipe folder; conan inspect is only run (concurrently)
+  for recipes whose options are computed
+- Caches recipe options and dependencies on disk, keyed by recipe content
 - Performs topological sort based on dependencies
+- Exports recipe folders concurrently, skipping versions whose recipe
+  revision is already the latest one in the cache
 - Uses Conan profiles for C++ standard configuration
-- Validates configurations via conan graph info
-- Builds packages stage by stage in correct order
-- Optionally uploads to remote after build
+- Optionally builds only what changed since a git ref (--since)
+- Lists the build matrix as JSON (--list-matrix) and builds one of N
+  cost-balanced shards of it (--shard), for several CI runners
+- Validates all configurations in a single Conan API session and skips
+  those whose package binary already exists in the cache or on a remote
+- Locks the resolved dependency graph of every configuration in a lockfile
+  that its build then uses
+- Builds the third-party binaries missing on every remote once, before the
+  package builds and in dependency order (warm-up stage)
+- Builds every configuration from the exported recipe (conan install
+  --build), never exporting it again while other versions of the same
+  recipe folder build
+- Downloads the sources of everything to build once, into a shared
+  content-addressed cache that the builds read them from
+- Optionally compiles through ccache with one cache shared by every
+  build of the matrix (--ccache-dir)
+- Schedules builds from the dependency graph: a package starts as soon as
+  its own local dependencies are built, longest dependency chain first,
+  running independent package/version/profile builds concurrently (--jobs)
+- Packs concurrent builds and their tools.build:jobs into the machine's
+  cores and free memory, from the build_resources hints in config.yml and
+  the peak memory measured in earlier runs
+- Streams the output of every build into a compressed log file per build
+  and phase, shown live with a prefix or as GitHub Actions groups, and
+  prints the tail of the log when a build fails
+- Retries builds failing with a transient (network) error, cancels the
+  builds depending on a failed one, and optionally stops everything at
+  the first failure (--fail-fast)
+- Records per-phase timings and peak memory of every build
+  (--report-json, --trace)
+- Keeps a history of build durations, statuses and peak memory that the
+  scheduler and the shards take their estimates from; the report
+  subcommand shows trends and regressions
+- Optionally uploads the built revisions to remote, in batches and in the
+  background while other builds run
 """
 
 import argparse
+import importlib.metadata
 import json
 import os
 import re
+import shlex
+import shutil
 import subprocess
 import sys
+import tempfile
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 import yaml
 
+from build_history import DEFAULT_DB_NAME, TREND_WINDOW, BuildHistory, print_report
+from build_log import (
+    OUTPUT_MODES, BuildLogs, default_output_mode, print_locked, terminate_all,
+)
+from build_report import RunReport, print_timeline
+from build_scheduler import (
+    BuildScheduler, FailurePolicy, ResourceBudget, available_cpus, available_memory,
+    build_matrix, invert_dependencies, resource_needs, shard_cells, split_build_jobs,
+    stage_dependencies, topological_sort,
+)
+from conan_graph import (
+    EXISTING_BINARY, GraphAnalyzer, configuration_args, find_package_node,
+    graph_build_order, plan_warmup,
+)
+from package_upload import UploadQueue, remote_has_package
+from recipe_metadata import RecipeMetadataCache, get_local_requires, load_recipe_metadata
+from source_cache import DEFAULT_SOURCE_CACHE, collect_sources, prefetch_sources
+from workspace import DEFAULT_CACHE_DIR, git_changed_files
+
 # Default parameters
 DEFAULT_BUILD_TYPE = "Release"
 
@@ -31,6 +91,9 @@ DEFAULT_BUILD_TYPE = "Release"
 # matrix. These are valid configurations to build, but cannot be exercised in CI.
 EXCLUDED_COMBINATIONS: set[tuple[str, str, str]] = set()
 
+# Remote that built packages are uploaded to
+DEFAULT_REMOTE = os.environ.get("CONAN_REMOTE", "otterbrix")
+
 
 def get_package_versions(config_path: Path) -> dict[str, str]:
     """Extract versions and their folder mappings from config.yml."""
@@ -46,89 +109,183 @@ def get_package_versions(config_path: Path) -> dict[str, str]:
     }
 
 
-def get_recipe_options(recipe_path: Path) -> dict:
-    """Get available options from recipe via conan inspect."""
-    cmd = ["conan", "inspect", str(recipe_path), "--format=json"]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            return data.get("options_definitions", {})
-    except Exception as e:
-        print(f"Warning: failed to inspect recipe: {e}", file=sys.stderr)
+def get_build_resources(config_path: Path) -> dict:
+    """
+    Resource hints from the optional build_resources section of config.yml.
+    Returns dict with 'memory_per_job' and 'base_memory' (bytes) and
+    'max_jobs' keys, None where not given or not a number.
+    """
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    resources = config.get("build_resources") if isinstance(config, dict) else None
+    if not isinstance(resources, dict):
+        if resources is not None:
+            print(f"Warning: {config_path}: build_resources is not a mapping, ignored",
+                  file=sys.stderr)
+        resources = {}
 
-    return {}
+    def number(key: str) -> int | None:
+        # Null, a string or a bool is reported by the linter and ignored here
+        value = resources.get(key)
+        return value if isinstance(value, int) and not isinstance(value, bool) else None
 
+    mib = 1024 * 1024
+    memory_per_job, base_memory = number("memory_per_job_mb"), number("base_memory_mb")
+    return {
+        "memory_per_job": memory_per_job * mib if memory_per_job is not None else None,
+        "base_memory": base_memory * mib if base_memory is not None else None,
+        "max_jobs": number("max_jobs"),
+    }
 
-def get_local_dependencies(recipe_path: Path, local_packages: set[str]) -> set[str]:
-    """
-    Extract local package dependencies from conanfile.py.
-    Only returns dependencies that are in local_packages set.
-    """
-    conanfile = recipe_path / "conanfile.py"
-    if not conanfile.exists():
-        return set()
 
+def get_conan_home() -> Path | None:
+    """Conan home folder, or None if unknown."""
     try:
-        content = conanfile.read_text()
-        # Find self.requires("package/version") patterns
-        requires_pattern = r'self\.requires\s*\(\s*["\']([^/"\']+)/[^"\']+["\']\s*'
-        matches = re.findall(requires_pattern, content)
-        return set(m for m in matches if m in local_packages)
-    except Exception as e:
-        print(f"Warning: failed to parse dependencies: {e}", file=sys.stderr)
-        return set()
+        result = subprocess.run(["conan", "config", "home"], capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    home = result.stdout.strip()
+    return Path(home) if result.returncode == 0 and home else None
 
 
-def topological_sort(packages: dict[str, set[str]]) -> list[list[str]]:
+def ccache_stats(ccache_dir: Path) -> dict[str, int] | None:
     """
-    Perform topological sort on packages based on dependencies.
-    Returns list of stages, where each stage contains packages
-    that can be built in parallel (no inter-dependencies).
+    Statistics counters of a ccache directory (ccache --print-stats, ccache
+    4+), or None if unavailable.
     """
-    in_degree = defaultdict(int)
-    dependents = defaultdict(set)
-    all_packages = set(packages.keys())
-
-    for pkg, deps in packages.items():
-        local_deps = deps & all_packages
-        in_degree[pkg] = len(local_deps)
-        for dep in local_deps:
-            dependents[dep].add(pkg)
-
-    stages = []
-    remaining = set(all_packages)
-
-    while remaining:
-        ready = [pkg for pkg in remaining if in_degree[pkg] == 0]
+    try:
+        result = subprocess.run(
+            ["ccache", "--print-stats"], capture_output=True, text=True, timeout=60,
+            env={**os.environ, "CCACHE_DIR": str(ccache_dir)},
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+
+    stats = {}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition("\t")
+        if value.strip().isdigit():
+            stats[key] = int(value)
+    return stats
+
+
+def get_conan_version() -> str:
+    """Version of the installed Conan client, or '' if unknown."""
+    try:
+        return importlib.metadata.version("conan")
+    except importlib.metadata.PackageNotFoundError:
+        pass
 
-        if not ready:
-            print(f"Warning: circular dependency detected among: {remaining}", file=sys.stderr)
-            stages.append(list(remaining))
-            break
+    # Conan installed outside this interpreter (pipx, installer, ...)
+    try:
+        result = subprocess.run(["conan", "--version"], capture_output=True, text=True, timeout=60)
+        m = re.search(r"(\d+\.\d+\S*)", result.stdout)
+        return m.group(1) if m else ""
+    except Exception:
+        return ""
 
-        stages.append(sorted(ready))
 
-        for pkg in ready:
-            remaining.remove(pkg)
-            for dependent in dependents[pkg]:
-                if dependent in remaining:
-                    in_degree[dependent] -= 1
+def export_recipe(recipe_path: Path, version: str) -> str | None:
+    """
+    Export recipe to local conan cache.
+    Returns the exported recipe revision, or None if the export failed.
+    """
+    cmd = ["conan", "export", str(recipe_path), f"--version={version}", "--format=json"]
 
-    return stages
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode == 0:
+            reference = json.loads(result.stdout)["reference"]
+            return reference.partition("#")[2] or None
+    except Exception as e:
+        print(f"Warning: export failed: {e}", file=sys.stderr)
+    return None
 
 
-def export_recipe(recipe_path: Path, version: str) -> bool:
-    """Export recipe to local conan cache."""
-    cmd = ["conan", "export", str(recipe_path), f"--version={version}"]
+def list_recipe_revisions(package_name: str) -> dict[str, str]:
+    """
+    Get the latest recipe revision of every version of a package in the
+    local cache.
+    Returns dict: version -> recipe revision (empty if conan list failed)
+    """
+    cmd = ["conan", "list", f"{package_name}/*#*", "--format=json"]
 
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        return result.returncode == 0
+        if result.returncode != 0:
+            return {}
+        data = json.loads(result.stdout)
     except Exception as e:
-        print(f"Warning: export failed: {e}", file=sys.stderr)
-        return False
+        print(f"Warning: failed to list {package_name} revisions: {e}", file=sys.stderr)
+        return {}
+
+    latest = {}
+    for ref, ref_info in data.get("Local Cache", {}).items():
+        revisions = ref_info.get("revisions") or {}
+        if revisions:
+            version = ref.split("/", 1)[1].split("@")[0]
+            latest[version] = max(revisions, key=lambda r: revisions[r].get("timestamp", 0))
+    return latest
+
+
+def export_recipes(
+    package_info: dict,
+    cache: RecipeMetadataCache | None = None,
+    report: RunReport | None = None,
+) -> dict[str, str]:
+    """
+    Export every version of every package, distinct recipe folders concurrently.
+    Versions already exported as the latest revision in the cache are skipped.
+    Returns dict: "package/version" -> "exported", "cached" or "failed"
+    """
+    groups = defaultdict(list)
+    for package_name, info in package_info.items():
+        for version, recipe_path in info["version_info"].items():
+            groups[recipe_path].append((package_name, version))
+
+    workers = min(len(groups), max(4, available_cpus())) or 1
+    latest = {}
+    if cache:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latest = dict(zip(package_info, pool.map(list_recipe_revisions, package_info)))
+
+    def export_group(recipe_path: Path, refs: list[tuple[str, str]]) -> list[tuple]:
+        recorded = cache.get_exports(recipe_path) if cache else {}
+        results = []
+        for package_name, version in refs:
+            revision = recorded.get(version)
+            if revision and revision == latest.get(package_name, {}).get(version):
+                results.append((recipe_path, package_name, version, revision, "cached"))
+                continue
+            if report is None:
+                revision = export_recipe(recipe_path, version)
+            else:
+                with report.span("export", f"{package_name}/{version}"):
+                    revision = export_recipe(recipe_path, version)
+            status = "exported" if revision else "failed"
+            results.append((recipe_path, package_name, version, revision, status))
+        return results
+
+    statuses = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(export_group, path, refs) for path, refs in groups.items()]
+        for future in futures:
+            for recipe_path, package_name, version, revision, status in future.result():
+                ref = f"{package_name}/{version}"
+                statuses[ref] = status
+                if status == "exported":
+                    print(f"  Exported {ref}#{revision}")
+                    if cache:
+                        cache.put_export(recipe_path, version, revision)
+                elif status == "cached":
+                    print(f"  Up to date {ref}#{revision}")
+                else:
+                    print(f"  Failed to export {ref}", file=sys.stderr)
+                if report is not None and status != "failed":
+                    report.count("export_cache_hit" if status == "cached" else "export_cache_miss")
+    return statuses
 
 
 def discover_profiles(profiles_dir: Path) -> list[dict]:
@@ -164,118 +321,138 @@ def discover_profiles(profiles_dir: Path) -> list[dict]:
     return profiles
 
 
-def check_valid_configuration(
-    package_name: str,
+def build_package(
+    recipe_path: Path,
     version: str,
-    cxx_standard: int | None,
+    cxx_standard: int | None = None,
     build_type: str = "Release",
     profile_path: Path | None = None,
-) -> bool:
+    build_jobs: int | None = None,
+    stats: dict | None = None,
+    source_cache: Path | None = None,
+    lockfile: Path | None = None,
+    compiler_launcher: str | None = None,
+    build_options: list[str] | None = None,
+    logs: BuildLogs | None = None,
+) -> dict | None:
     """
-    Check if configuration is valid using conan graph info.
-    Requires recipe to be exported first.
-    Returns True if valid, False if ConanInvalidConfiguration.
+    Build a single package configuration from its exported recipe using conan install --build.
+    Returns the created package ('ref', 'package_id', 'prev'), or None if the build failed.
+    Peak RSS, log, invalid reason and transient error are stored in stats.
     """
+    package_name = recipe_path.parent.name
+    ref = f"{package_name}/{version}"
+    # The environment scripts conan install generates are not needed
+    output_folder = tempfile.mkdtemp(prefix="conan-install-")
+
     cmd = [
-        "conan", "graph", "info",
-        f"--requires={package_name}/{version}",
-        "-s", f"build_type={build_type}",
+        "conan", "install",
+        f"--requires={ref}",
+        f"--build={ref}",
+        "--build=missing",
+        f"--output-folder={output_folder}",
+        "--format=json",
+        *configuration_args(package_name, cxx_standard, build_type, profile_path, build_jobs, lockfile),
     ]
+    if source_cache is not None:
+        cmd.extend(["-cc", f"core.sources:download_cache={source_cache}"])
+    # Neither may affect the package_id, which the analysis computed without them
+    if compiler_launcher is not None:
+        cmd.extend(["-c", f"user.duckstax:compiler_launcher={compiler_launcher}"])
+    for option in build_options or []:
+        cmd.extend(["-o", option])
 
-    if profile_path is not None:
-        cmd.extend(["-pr:h", str(profile_path)])
-
-    if cxx_standard is not None:
-        cmd.extend(["-o", f"{package_name}/*:cxx_standard={cxx_standard}"])
+    std_str = f" C++{cxx_standard}" if cxx_standard else ""
+    profile_str = f" [{profile_path.name}]" if profile_path else ""
+    print_locked(f"\n{'='*60}\nBuilding: {package_name}/{version}{std_str}{profile_str}\n"
+                 f"{'='*60}\nCommand: {' '.join(cmd)}\n")
 
+    # Build output goes to stderr; stdout only carries the JSON graph
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-        output = result.stdout + result.stderr
-
-        # Check for invalid configuration
-        if "Invalid" in output and package_name in output:
-            return False
+        result = (logs or BuildLogs()).run(
+            cmd, f"{package_name}/{version}{std_str}{profile_str}", "create", capture_stdout=True,
+        )
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    if stats is not None:
+        stats["peak_rss"] = result["peak_rss"]
+        stats["log"] = str(result["log"]) if result["log"] else None
+        if result["invalid"]:
+            stats["invalid"] = result["invalid"]
+        if result["transient"]:
+            stats["transient"] = result["transient"]
+    if result["returncode"] != 0:
+        return None
 
-        if result.returncode != 0:
-            print(f"  validate {package_name}/{version}: returncode={result.returncode}",
-                  file=sys.stderr)
-            # Print last few lines of output for diagnostics
-            lines = output.strip().splitlines()
-            for line in lines[-5:]:
-                print(f"    {line}", file=sys.stderr)
-
-        return result.returncode == 0
-
-    except subprocess.TimeoutExpired:
-        print(f"Warning: timeout checking {package_name}/{version}", file=sys.stderr)
-        return False
-    except Exception as e:
-        print(f"Warning: error checking {package_name}/{version}: {e}", file=sys.stderr)
-        return False
+    try:
+        package = find_package_node(json.loads(result["stdout"]), package_name, version)
+    except ValueError:
+        package = None
+    if package is None:
+        print_locked(f"Warning: could not read created revision of {package_name}/{version}",
+                     file=sys.stderr)
+        return {"ref": ref, "package_id": None, "prev": None}
+    return package
 
 
-def build_package(
+def test_package(
     recipe_path: Path,
     version: str,
     cxx_standard: int | None = None,
     build_type: str = "Release",
     profile_path: Path | None = None,
+    build_jobs: int | None = None,
+    stats: dict | None = None,
+    lockfile: Path | None = None,
+    logs: BuildLogs | None = None,
 ) -> bool:
-    """Build a single package configuration using conan create."""
+    """
+    Run the recipe's test_package against a created package using conan test.
+    Returns True if the test passed or the recipe has no test_package.
+    """
     package_name = recipe_path.parent.name
+    test_folder = recipe_path / "test_package"
+    if not test_folder.is_dir():
+        return True
 
+    # conan test builds inside the test folder: concurrent tests of versions
+    # sharing a recipe folder each get a copy of it
+    work_dir = Path(tempfile.mkdtemp(prefix="conan-test-"))
+    shutil.copytree(test_folder, work_dir / "test_package")
     cmd = [
-        "conan", "create",
-        str(recipe_path),
-        f"--version={version}",
+        "conan", "test",
+        str(work_dir / "test_package"),
+        f"{package_name}/{version}",
         "--build=missing",
-        "-s", f"build_type={build_type}",
+        *configuration_args(package_name, cxx_standard, build_type, profile_path, build_jobs, lockfile),
     ]
-
-    if profile_path is not None:
-        cmd.extend(["-pr:h", str(profile_path)])
-
-    if cxx_standard is not None:
-        cmd.extend(["-o", f"{package_name}/*:cxx_standard={cxx_standard}"])
+    print_locked(f"Testing: {package_name}/{version}\nCommand: {' '.join(cmd)}\n")
 
     std_str = f" C++{cxx_standard}" if cxx_standard else ""
     profile_str = f" [{profile_path.name}]" if profile_path else ""
-    print(f"\n{'='*60}")
-    print(f"Building: {package_name}/{version}{std_str}{profile_str}")
-    print(f"{'='*60}")
-    print(f"Command: {' '.join(cmd)}\n")
-
-    result = subprocess.run(cmd)
-    return result.returncode == 0
-
-
-def upload_package(package_name: str, version: str) -> bool:
-    """Upload package to remote if CONAN_REMOTE_URL is set."""
-    remote_url = os.environ.get("CONAN_REMOTE_URL", "")
-    if not remote_url:
-        print(f"  Skipping upload {package_name}/{version}: CONAN_REMOTE_URL not set")
-        return True
-
-    cmd = [
-        "conan", "upload",
-        f"{package_name}/{version}:*",
-        "-r=otterbrix",
-        "--confirm",
-    ]
-
-    print(f"Uploading: {package_name}/{version}")
-    result = subprocess.run(cmd)
-    return result.returncode == 0
+    try:
+        result = (logs or BuildLogs()).run(cmd, f"{package_name}/{version}{std_str}{profile_str}", "test")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if stats is not None:
+        stats["peak_rss"] = result["peak_rss"]
+        stats["log"] = str(result["log"]) if result["log"] else None
+        if result["transient"]:
+            stats["transient"] = result["transient"]
+    return result["returncode"] == 0
 
 
 def collect_packages(
     recipes_dir: Path,
     package_filter: str | None = None,
     version_filter: str | None = None,
+    cache: RecipeMetadataCache | None = None,
+    report: RunReport | None = None,
 ) -> dict:
     """
     Collect information about all packages in recipes directory.
-    Returns dict: package_name -> {recipe_path, versions, options, dependencies}
+    Returns dict: package_name -> {version_info, options, dependencies,
+    resources (see get_build_resources)}
     """
     package_info = {}
 
@@ -291,7 +468,9 @@ def collect_packages(
             if (package_dir / "config.yml").exists():
                 local_packages.add(package_dir.name)
 
-    # Collect info for each package
+    # Resolve version -> recipe folder for each package
+    package_versions = {}
+    package_resources = {}
     for package_dir in package_dirs:
         if not package_dir.is_dir() or package_dir.name.startswith("."):
             continue
@@ -322,31 +501,484 @@ def collect_packages(
                 continue
             version_info[version] = recipe_path
 
-        if not version_info:
-            continue
+        if version_info:
+            package_versions[package_name] = version_info
+            package_resources[package_name] = get_build_resources(config_path)
 
-        # Collect options and dependencies from all recipe folders
+    # Inspect each recipe folder once; many versions usually share one folder
+    recipe_paths = list(dict.fromkeys(
+        recipe_path
+        for version_info in package_versions.values()
+        for recipe_path in version_info.values()
+    ))
+    metadata = load_recipe_metadata(recipe_paths, cache, report)
+
+    # Collect options and dependencies from all recipe folders
+    for package_name, version_info in package_versions.items():
         all_dependencies = set()
         options = {}
-        for recipe_path in version_info.values():
-            opts = get_recipe_options(recipe_path)
+        for recipe_path in dict.fromkeys(version_info.values()):
+            opts = metadata[recipe_path]["options"]
             if not options:
                 options = opts
-            all_dependencies |= get_local_dependencies(recipe_path, local_packages)
-        dependencies = all_dependencies
+            all_dependencies |= metadata[recipe_path]["requires"] & local_packages
 
         package_info[package_name] = {
             "version_info": version_info,
             "options": options,
-            "dependencies": dependencies,
+            "dependencies": all_dependencies,
+            "resources": package_resources[package_name],
         }
 
     return package_info
 
 
+def plan_package_builds(
+    package_name: str,
+    info: dict,
+    profiles: list[dict],
+    skipped: list[str],
+    selected: set[tuple[str, str, str]] | None = None,
+) -> list[dict]:
+    """
+    Expand a package into its build cells, one per version x profile in selected (if given).
+    Configurations that cannot be built are appended to skipped.
+    Returns list of dicts with 'package', 'version', 'recipe_path', 'profile', 'cxx_std', 'build_id'.
+    """
+    options = info["options"]
+    has_cxx_standard = "cxx_standard" in options
+    cells = []
+
+    for profile in profiles:
+        profile_cppstd = profile["cppstd"]
+        version_info = {
+            version: recipe_path
+            for version, recipe_path in info["version_info"].items()
+            if selected is None or (package_name, version, profile["name"]) in selected
+        }
+
+        # Determine cxx_standard option value for this profile
+        if has_cxx_standard:
+            available = options.get("cxx_standard", [])
+            if profile_cppstd is not None and available:
+                cppstd_str = str(profile_cppstd)
+                if cppstd_str not in [str(s) for s in available]:
+                    for version in version_info:
+                        build_id = f"{package_name}/{version} [{profile['name']}]"
+                        print(f"Skipping {build_id} - cxx_standard={profile_cppstd} not available")
+                        skipped.append(build_id)
+                    continue
+                cxx_std = profile_cppstd
+            else:
+                cxx_std = None
+        else:
+            cxx_std = None
+
+        for version, recipe_path in version_info.items():
+            build_id = f"{package_name}/{version}" + \
+                       (f" C++{cxx_std}" if cxx_std else "") + \
+                       f" [{profile['name']}]"
+
+            # Excluded combinations (see EXCLUDED_COMBINATIONS)
+            if (package_name, version, profile["name"]) in EXCLUDED_COMBINATIONS:
+                print(f"Skipping {build_id} - excluded combination")
+                skipped.append(build_id)
+                continue
+
+            cells.append({
+                "package": package_name,
+                "version": version,
+                "recipe_path": recipe_path,
+                "profile": profile,
+                "cxx_std": cxx_std,
+                "build_id": build_id,
+            })
+
+    return cells
+
+
+def load_yaml_at(root: Path, commit: str, path: str) -> dict | None:
+    """Load a YAML file as of commit. Returns None if it did not exist."""
+    result = subprocess.run(
+        ["git", "show", f"{commit}:{path}"], cwd=root, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None
+    try:
+        return yaml.safe_load(result.stdout) or {}
+    except yaml.YAMLError:
+        return None
+
+
+def changed_conandata_versions(old: dict | None, new_path: Path) -> set[str] | None:
+    """
+    Versions whose sources or patches entries differ between old and the
+    current conandata.yml. Returns None if every version is affected.
+    """
+    if old is None or not new_path.exists():
+        return None
+    with open(new_path) as f:
+        new = yaml.safe_load(f) or {}
+
+    sections = ("sources", "patches")
+    if {k: v for k, v in old.items() if k not in sections} != \
+            {k: v for k, v in new.items() if k not in sections}:
+        return None
+
+    versions = set()
+    for section in sections:
+        old_entries = old.get(section) or {}
+        new_entries = new.get(section) or {}
+        for version in set(old_entries) | set(new_entries):
+            if old_entries.get(version) != new_entries.get(version):
+                versions.add(str(version))
+    return versions
+
+
+def changed_builds(
+    since: str,
+    recipes_dir: Path,
+    profiles_dir: Path | None,
+    package_info: dict,
+    dep_graph: dict[str, set[str]],
+    profile_names: list[str],
+) -> set[tuple[str, str, str]]:
+    """
+    Map files changed since a git ref to the affected
+    (package_name, version, profile_name) combinations, including every
+    downstream dependent of an affected package.
+    """
+    root, base, files = git_changed_files(since, recipes_dir)
+    recipes_rel = recipes_dir.resolve().relative_to(root).parts
+    profiles_rel = profiles_dir.resolve().relative_to(root).parts if profiles_dir else None
+
+    affected = set()
+
+    def add(package_name: str, versions, profiles=profile_names):
+        for version in versions:
+            for profile_name in profiles:
+                affected.add((package_name, version, profile_name))
+
+    for file in files:
+        parts = Path(file).parts
+
+        if profiles_rel and parts[:len(profiles_rel)] == profiles_rel:
+            profile_name = parts[len(profiles_rel)] if len(parts) > len(profiles_rel) else None
+            if profile_name in profile_names:
+                for package_name, info in package_info.items():
+                    add(package_name, info["version_info"], [profile_name])
+            continue
+
+        if parts[:len(recipes_rel)] != recipes_rel:
+            continue
+        rest = parts[len(recipes_rel):]
+        if not rest or rest[0] not in package_info:
+            continue
+        package_name = rest[0]
+        version_info = package_info[package_name]["version_info"]
+
+        if len(rest) == 2 and rest[1] == "config.yml":
+            # New versions or versions moved to another folder
+            old = load_yaml_at(root, base, file) or {}
+            old_versions = old.get("versions") or {}
+            add(package_name, [
+                v for v, recipe_path in version_info.items()
+                if (old_versions.get(v) or {}).get("folder") != recipe_path.name
+            ])
+            continue
+
+        if len(rest) < 3:
+            continue
+        folder = rest[1]
+        folder_versions = [v for v, recipe_path in version_info.items() if recipe_path.name == folder]
+
+        if len(rest) == 3 and rest[2] == "conandata.yml":
+            versions = changed_conandata_versions(
+                load_yaml_at(root, base, file), root / file,
+            )
+            if versions is not None:
+                folder_versions = [v for v in folder_versions if v in versions]
+        add(package_name, folder_versions)
+
+    # Expand to downstream dependents, transitively
+    dependents = invert_dependencies(dep_graph)
+    queue = sorted({(pkg, profile_name) for pkg, _, profile_name in affected})
+    seen = set(queue)
+    while queue:
+        pkg, profile_name = queue.pop()
+        for dependent in dependents[pkg]:
+            add(dependent, package_info[dependent]["version_info"], [profile_name])
+            if (dependent, profile_name) not in seen:
+                seen.add((dependent, profile_name))
+                queue.append((dependent, profile_name))
+
+    return affected
+
+
+def run_build(cell: dict, args: argparse.Namespace, build_jobs: int | None) -> str:
+    """
+    Build a single cell, retrying transient failures as args.policy allows.
+    Returns 'succeeded', 'failed', 'skipped' (invalid configuration) or 'cancelled'.
+    """
+    policy = args.policy
+    cell["jobs"] = build_jobs
+    attempt = 0
+    while True:
+        status, transient = build_cell(cell, args, build_jobs)
+        if status == "failed" and policy.stopped.is_set():
+            return "cancelled"
+        if status != "failed" or not transient:
+            break
+        delay = policy.retry_delay(attempt)
+        if delay is None:
+            break
+        attempt += 1
+        args.report.count("retries")
+        print_locked(f"Retrying {cell['build_id']} in {delay:.0f}s "
+                     f"(attempt {attempt + 1}), transient error: {transient}", file=sys.stderr)
+        if not policy.wait(delay):
+            return "cancelled"
+
+    if status == "failed":
+        policy.record_failure(cell)
+    return status
+
+
+def build_cell(cell: dict, args: argparse.Namespace, build_jobs: int | None) -> tuple[str, str | None]:
+    """
+    Build and test a single cell once.
+    Returns (status as for run_build(), transient error of a failure or None).
+    The log of a failed phase is stored in the cell ('log').
+    """
+    version = cell["version"]
+    profile_path = cell["profile"]["path"]
+    build_args = (
+        cell["recipe_path"], version, cell["cxx_std"],
+        args.build_type, profile_path, build_jobs,
+    )
+
+    # The builds use the exported recipe; conan install would look for it on the remotes
+    if not cell.get("exported", True):
+        print_locked(f"Not building {cell['build_id']}: its recipe failed to export", file=sys.stderr)
+        return "failed", None
+
+    # Build
+    with args.report.span("create", cell["build_id"]) as stats:
+        package = build_package(
+            *build_args, stats=stats, source_cache=args.source_cache, lockfile=cell.get("lockfile"),
+            compiler_launcher=args.compiler_launcher, build_options=args.build_option,
+            logs=args.logs,
+        )
+    if package is None:
+        if stats.get("invalid"):
+            print_locked(f"Skipping {cell['build_id']} - invalid configuration: {stats['invalid']}")
+            return "skipped", None
+        cell["log"] = stats.get("log")
+        return "failed", stats.get("transient")
+
+    with args.report.span("test_package", cell["build_id"]) as stats:
+        if not test_package(*build_args, stats=stats, lockfile=cell.get("lockfile"), logs=args.logs):
+            cell["log"] = stats.get("log")
+            return "failed", stats.get("transient")
+
+    if args.upload_queue:
+        args.upload_queue.put(package, cell["build_id"])
+    return "succeeded", None
+
+
+def prefetch_build_sources(cells: list[dict], cache_dir: Path, report: RunReport):
+    """
+    Download the sources of every version about to be built into the shared source cache.
+    Failed downloads are left to the builds to retry and report.
+    """
+    versions = defaultdict(set)
+    for cell in cells:
+        versions[cell["recipe_path"]].add(cell["version"])
+
+    sources = [
+        (urls, sha256)
+        for recipe_path, wanted in versions.items()
+        for version, urls, sha256 in collect_sources(recipe_path / "conandata.yml")
+        if version in wanted
+    ]
+    if not sources:
+        return
+
+    print(f"\nFetching {len(sources)} source archive(s) into {cache_dir}...")
+    with report.span("sources", str(cache_dir), archives=len(sources)):
+        results = prefetch_sources(sources, cache_dir, jobs=4)
+
+    for status, error in results.values():
+        report.count("source_cache_hit" if status == "cached" else "source_cache_miss")
+        if error:
+            print(f"Warning: {error}", file=sys.stderr)
+
+
+def warmup_build(item: dict, args: argparse.Namespace, build_jobs: int | None) -> bool:
+    """Build a single third-party binary into the local cache with conan install."""
+    cell = item["cell"]
+    cmd = [
+        "conan", "install",
+        *shlex.split(item["build_args"]),
+        *configuration_args(
+            cell["package"], cell["cxx_std"], args.build_type, cell["profile"]["path"],
+            build_jobs, cell.get("lockfile"),
+        ),
+    ]
+    if args.source_cache is not None:
+        cmd.extend(["-cc", f"core.sources:download_cache={args.source_cache}"])
+    print_locked(f"Warm-up: {item['pref']}\nCommand: {' '.join(cmd)}\n")
+
+    key = item["ref"].split("#")[0]
+    with args.report.span("warmup", key, pref=item["pref"]) as stats:
+        result = args.logs.run(cmd, f"{key}:{item['pref'].rsplit(':', 1)[-1][:8]}", "warmup")
+        stats["peak_rss"] = result["peak_rss"]
+        stats["log"] = str(result["log"]) if result["log"] else None
+    return result["returncode"] == 0
+
+
+def run_warmup(plan: dict[str, dict], args: argparse.Namespace, slots: int) -> list[str]:
+    """
+    Build the planned third-party binaries, up to `slots` at a time, dependencies first.
+    Returns the prefs that failed or were not attempted.
+    """
+    build_jobs = split_build_jobs(slots)
+    done = set()
+    failed = []
+    pending = dict(plan)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=slots) as pool:
+        while pending or running:
+            for pref, item in list(pending.items()):
+                if any(d in failed for d in item["depends"]):
+                    print_locked(f"Warning: not warming up {pref}, a dependency failed", file=sys.stderr)
+                    failed.append(pref)
+                    del pending[pref]
+                elif len(running) < slots and all(d in done for d in item["depends"]):
+                    running[pool.submit(warmup_build, item, args, build_jobs)] = pref
+                    del pending[pref]
+
+            if not running:
+                # Only reachable with a dependency cycle
+                failed.extend(pending)
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pref = running.pop(future)
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print_locked(f"Warning: warm-up of {pref} failed: {e}", file=sys.stderr)
+                    ok = False
+                if ok:
+                    done.add(pref)
+                else:
+                    print_locked(f"Warning: warm-up of {pref} failed", file=sys.stderr)
+                    failed.append(pref)
+    return failed
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse --shard I/N (1-based)."""
+    m = re.fullmatch(r"(\d+)/(\d+)", value.strip())
+    if not m or not 1 <= int(m.group(1)) <= int(m.group(2)):
+        raise argparse.ArgumentTypeError(f"expected I/N with 1 <= I <= N, got '{value}'")
+    return int(m.group(1)), int(m.group(2))
+
+
+def report_command(argv: list[str]) -> int:
+    """The report subcommand: build duration trends and regressions."""
+    parser = argparse.ArgumentParser(
+        prog="build_packages.py report",
+        description="Show the recent builds of every configuration from the build "
+                    "history, with their trend and regressions",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory of the build history (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--package",
+        type=str,
+        default=None,
+        help="Only show this package",
+    )
+    parser.add_argument(
+        "--last",
+        type=int,
+        default=TREND_WINDOW,
+        help=f"Number of builds per configuration to show (default: {TREND_WINDOW})",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Flag a build slower or larger than the median before it times "
+             "this (default: 1.2)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with status 1 if a regression is found",
+    )
+    args = parser.parse_args(argv)
+
+    path = args.cache_dir / DEFAULT_DB_NAME
+    if not path.exists():
+        print(f"No build history at {path}")
+        return 0
+    history = BuildHistory(path)
+    regressions = print_report(history, args.package, args.last, args.threshold)
+    history.close()
+    if regressions:
+        print(f"\n{regressions} configuration(s) regressed")
+    return 1 if regressions and args.check else 0
+
+
+def merge_history_command(argv: list[str]) -> int:
+    """The merge-history subcommand: combine build histories of several machines."""
+    parser = argparse.ArgumentParser(
+        prog="build_packages.py merge-history",
+        description="Add the builds recorded in other build history databases "
+                    "(e.g. one per CI shard) to the local one",
+    )
+    parser.add_argument(
+        "databases",
+        type=Path,
+        nargs="*",
+        help="Build history databases to merge",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory of the build history (default: {DEFAULT_CACHE_DIR})",
+    )
+    args = parser.parse_args(argv)
+
+    history = BuildHistory(args.cache_dir / DEFAULT_DB_NAME)
+    for path in args.databases:
+        if not path.is_file():
+            print(f"Warning: {path} not found", file=sys.stderr)
+            continue
+        print(f"{path}: {history.merge(path)} build(s) added")
+    history.close()
+    return 0
+
+
 def main():
+    if sys.argv[1:2] == ["report"]:
+        sys.exit(report_command(sys.argv[2:]))
+    if sys.argv[1:2] == ["merge-history"]:
+        sys.exit(merge_history_command(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(
-        description="Build all packages in dependency order"
+        description="Build all packages in dependency order "
+                    "('build_packages.py report|merge-history --help' for the build history)"
     )
     parser.add_argument(
         "recipes_dir",
@@ -365,6 +997,18 @@ def main():
         default="false",
         help="Upload after build (true/false)",
     )
+    parser.add_argument(
+        "--upload-jobs",
+        type=int,
+        default=2,
+        help="Maximum number of uploads in flight (default: 2)",
+    )
+    parser.add_argument(
+        "--upload-batch",
+        type=int,
+        default=4,
+        help="Number of built packages uploaded per conan upload call (default: 4)",
+    )
     parser.add_argument(
         "--build-type",
         type=str,
@@ -374,11 +1018,198 @@ def main():
     parser.add_argument(
         "--skip-validation",
         action="store_true",
-        help="Skip conan graph info validation (faster, but may include invalid configs)",
+        help="Build configurations the graph analysis finds invalid instead of skipping "
+             "them (the build then reports them). The analysis still runs to find "
+             "existing binaries and lock the graphs; with --force-build as well it "
+             "is skipped altogether",
+    )
+    parser.add_argument(
+        "--force-build",
+        action="store_true",
+        help="Build even if the package binary already exists in the cache or on a remote",
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help="Number of package builds to run concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=None,
+        metavar="MIB",
+        help="Memory budget of concurrent builds in MiB (default: memory available at start)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for persistent caches (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the recipe metadata cache",
+    )
+    parser.add_argument(
+        "--source-cache",
+        type=Path,
+        default=DEFAULT_SOURCE_CACHE,
+        help=f"Shared download cache for recipe sources (default: {DEFAULT_SOURCE_CACHE})",
+    )
+    parser.add_argument(
+        "--ccache-dir",
+        type=Path,
+        default=None,
+        help="Compile through ccache with this cache directory, shared by all builds",
+    )
+    parser.add_argument(
+        "--build-option",
+        action="append",
+        default=[],
+        metavar="PATTERN:OPTION=VALUE",
+        help="Option passed to the package builds only, for options that change how a "
+             "package is built but not its package_id, e.g. "
+             "otterbrix/*:unity_build=True (repeatable)",
+    )
+    parser.add_argument(
+        "--lockfile-dir",
+        type=Path,
+        default=None,
+        help="Keep the lockfile of every configuration in this directory "
+             "(default: a temporary directory)",
+    )
+    parser.add_argument(
+        "--no-warmup",
+        action="store_true",
+        help="Do not build missing third-party binaries before the package builds; "
+             "leave them to the package builds (--build=missing)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="Retry a build failing with a transient network error up to this "
+             "many times (default: 2)",
+    )
+    parser.add_argument(
+        "--retry-delay",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="Wait before the first retry, doubled on every further one (default: 30)",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stop at the first failed build: terminate the running builds "
+             "and start no more",
+    )
+    parser.add_argument(
+        "--log-dir",
+        type=Path,
+        default=None,
+        help="Write a gzip-compressed log per build and phase to this directory "
+             "(default: a temporary directory)",
+    )
+    parser.add_argument(
+        "--log-output",
+        choices=OUTPUT_MODES,
+        default=default_output_mode(),
+        help="Live build output: lines prefixed with the build (prefix), one "
+             "GitHub Actions group per finished process (group), or only the "
+             "tail of failed builds (quiet). Default: group on GitHub Actions, "
+             "prefix elsewhere",
+    )
+    parser.add_argument(
+        "--report-json",
+        type=Path,
+        default=None,
+        help="Write a JSON run report (per-build phase times, peak RSS, cache hits)",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="Write a Chrome trace-event file of the run (chrome://tracing, Perfetto)",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        metavar="GIT_REF",
+        help="Only build configurations affected by changes since this git ref, "
+             "plus their downstream dependents",
+    )
+    parser.add_argument(
+        "--list-matrix",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="FILE",
+        help="Write the build cells with their dependencies as JSON to FILE "
+             "(default: stdout) and exit without building",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        metavar="I/N",
+        help="Only build shard I of N: cells linked by dependencies stay "
+             "together, balanced by estimated build time",
+    )
+    parser.add_argument(
+        "--matrix",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="Take the estimated build times from a --list-matrix file rather "
+             "than the local build history, so that every runner computes the "
+             "same shards",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=["dag", "stages"],
+        default="dag",
+        help="Start a package once its own dependencies are built (dag, default), "
+             "or wait for the whole previous stage (stages)",
     )
 
     args = parser.parse_args()
     do_upload = args.upload.lower() == "true"
+    # The matrix alone goes to stdout, everything else to stderr
+    matrix_out = sys.stdout
+    if args.list_matrix == "-":
+        sys.stdout = sys.stderr
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.retries < 0:
+        parser.error("--retries must not be negative")
+    # Conan requires an absolute download cache path
+    args.source_cache = args.source_cache.resolve()
+    log_dir = (args.log_dir or Path(tempfile.mkdtemp(prefix="conan-build-logs-"))).resolve()
+    args.logs = BuildLogs(log_dir, args.log_output)
+
+    # Compiler cache shared by all builds. Builds of one version for several
+    # profiles run in different Conan cache folders: paths are made relative
+    # to the Conan home and the working directory is not hashed, so that they
+    # hit each other's entries.
+    args.compiler_launcher = None
+    ccache_before = None
+    if args.ccache_dir is not None:
+        if shutil.which("ccache") is None:
+            print("Warning: ccache not found, building without compiler cache", file=sys.stderr)
+        else:
+            args.ccache_dir = args.ccache_dir.resolve()
+            args.ccache_dir.mkdir(parents=True, exist_ok=True)
+            os.environ["CCACHE_DIR"] = str(args.ccache_dir)
+            os.environ["CCACHE_NOHASHDIR"] = "true"
+            conan_home = get_conan_home()
+            if conan_home is not None:
+                os.environ["CCACHE_BASEDIR"] = str(conan_home)
+            args.compiler_launcher = "ccache"
+            ccache_before = ccache_stats(args.ccache_dir)
 
     # Discover profiles
     profiles_dir = args.profiles_dir
@@ -404,7 +1235,14 @@ def main():
     print(f"  CONAN_REMOTE_URL set: {bool(remote_url)}")
     if remote_url:
         print(f"  CONAN_REMOTE_URL: {remote_url[:20]}...")
+    if do_upload:
+        print(f"  upload remote: {DEFAULT_REMOTE} "
+              f"(jobs: {args.upload_jobs}, batch: {args.upload_batch})")
     print(f"  profiles: {[p['name'] for p in profiles]}")
+    print(f"  jobs: {args.jobs} (cpus: {available_cpus()})")
+    print(f"  logs: {log_dir} (output: {args.log_output})")
+    if args.compiler_launcher:
+        print(f"  compiler cache: {args.ccache_dir}")
     print(f"{'='*60}\n")
 
     # Get filters from environment
@@ -417,7 +1255,15 @@ def main():
         sys.exit(1)
 
     # Collect package info
-    package_info = collect_packages(recipes_dir, package_filter, version_filter)
+    cache = None
+    if not args.no_cache:
+        cache = RecipeMetadataCache(args.cache_dir, get_conan_version())
+    report = args.report = RunReport()
+    package_info = collect_packages(recipes_dir, package_filter, version_filter, cache, report)
+    if cache:
+        report.count("recipe_cache_hit", cache.hits)
+        report.count("recipe_cache_miss", cache.misses)
+        print(f"Recipe metadata cache: {cache.hits} hit(s), {cache.misses} miss(es)")
 
     if not package_info:
         print("No packages found")
@@ -429,88 +1275,273 @@ def main():
 
     print(f"\nBuild order (stages): {stages}\n")
 
-    # Export all recipes first
-    print("Exporting all recipes...")
-    for package_name, info in package_info.items():
-        for version, recipe_path in info["version_info"].items():
-            if export_recipe(recipe_path, version):
-                print(f"  Exported {package_name}/{version}")
-            else:
-                print(f"  Failed to export {package_name}/{version}", file=sys.stderr)
-
-    # Build stage by stage
+    # Plan every build cell, in dependency order
     failed = []
     succeeded = []
     skipped = []
-
-    for stage_num, stage_packages in enumerate(stages):
-        print(f"\n{'#'*60}")
-        print(f"# STAGE {stage_num}: {stage_packages}")
-        print(f"{'#'*60}")
-
+    cancelled = []
+
+    selected = None
+    if args.since:
+        try:
+            selected = changed_builds(
+                args.since, recipes_dir, profiles_dir, package_info, dep_graph,
+                [p["name"] for p in profiles],
+            )
+            print(f"Changes since {args.since} affect {len(selected)} configuration(s)")
+        except subprocess.CalledProcessError as e:
+            print(f"Warning: cannot diff against {args.since}, building everything: "
+                  f"{e.stderr.strip()}", file=sys.stderr)
+
+    cells = []
+    for stage_packages in stages:
         for package_name in stage_packages:
             if package_name not in package_info:
                 continue
-
-            info = package_info[package_name]
-            version_info = info["version_info"]
-            options = info["options"]
-            has_cxx_standard = "cxx_standard" in options
-
-            for profile in profiles:
-                profile_path = profile["path"]
-                profile_cppstd = profile["cppstd"]
-
-                # Determine cxx_standard option value for this profile
-                if has_cxx_standard:
-                    available = options.get("cxx_standard", [])
-                    if profile_cppstd is not None and available:
-                        cppstd_str = str(profile_cppstd)
-                        if cppstd_str not in [str(s) for s in available]:
-                            for version in version_info:
-                                build_id = f"{package_name}/{version} [{profile['name']}]"
-                                print(f"Skipping {build_id} - cxx_standard={profile_cppstd} not available")
-                                skipped.append(build_id)
-                            continue
-                        cxx_std = profile_cppstd
-                    else:
-                        cxx_std = None
+            cells.extend(plan_package_builds(
+                package_name, package_info[package_name], profiles, skipped, selected,
+            ))
+
+    # Estimated durations: the local build history, or the one of the run
+    # that listed the matrix
+    history = BuildHistory(args.cache_dir / DEFAULT_DB_NAME)
+    listed = {}
+    if args.matrix:
+        try:
+            listed = {c["build_id"]: c["estimate"] for c in json.loads(args.matrix.read_text())["cells"]}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Warning: ignoring matrix {args.matrix}: {e}", file=sys.stderr)
+    for cell in cells:
+        cell["requires"] = get_local_requires(cell["recipe_path"], set(package_info))
+        if cell["build_id"] in listed:
+            cell["estimate"] = listed[cell["build_id"]]
+        else:
+            cell["estimate"] = history.estimate(
+                cell["package"], cell["version"], cell["profile"]["name"], args.build_type,
+            )
+
+    if args.shard:
+        index, count = args.shard
+        cells = shard_cells(cells, dep_graph, count)[index - 1]
+        print(f"Shard {index}/{count}: {len(cells)} configuration(s)")
+
+    if args.list_matrix:
+        matrix = json.dumps(build_matrix(cells, dep_graph), indent=2)
+        if args.list_matrix == "-":
+            print(matrix, file=matrix_out)
+        else:
+            Path(args.list_matrix).write_text(matrix + "\n")
+            print(f"Build matrix written to {args.list_matrix}")
+        if cache:
+            cache.save()
+        history.close()
+        return
+
+    planned_cells = list(cells)
+
+    # Export all recipes
+    print("Exporting all recipes...")
+    exports = export_recipes(package_info, cache, report)
+    if cache:
+        cache.save()
+    for cell in cells:
+        cell["exported"] = exports.get(f"{cell['package']}/{cell['version']}") != "failed"
+
+    # Uploads run in the background while builds go on
+    args.upload_queue = None
+    if do_upload:
+        if remote_url:
+            args.upload_queue = UploadQueue(
+                DEFAULT_REMOTE, args.upload_jobs, args.upload_batch, report, args.logs,
+            )
+        else:
+            print("Skipping uploads: CONAN_REMOTE_URL not set")
+
+    # Validate all configurations, look up existing binaries and lock the
+    # dependency graphs in one pass; only --skip-validation and
+    # --force-build together leave nothing for it to do
+    up_to_date = []
+    third_party_missing = {}
+    warmup_failed = []
+    lockfile_dir = args.lockfile_dir or Path(tempfile.mkdtemp(prefix="conan-lockfiles-"))
+    if (not args.skip_validation or not args.force_build) and cells:
+        print("\nAnalyzing configurations...")
+        analyzer = GraphAnalyzer(
+            args.build_type, workers=max(4, available_cpus()), report=report,
+            lockfile_dir=lockfile_dir,
+        )
+        if not analyzer.in_process:
+            print("  Conan Python API not available, using conan graph info")
+        analysis = analyzer.analyze(cells)
+
+        pending_cells = []
+        cached = []
+        for cell in cells:
+            result = analysis[cell["build_id"]]
+            cell["lockfile"] = result["lockfile"]
+            cell["requires"] = result["requires"]
+            if not result["valid"] and not args.skip_validation:
+                print(f"Skipping {cell['build_id']} - invalid configuration: {result['reason']}")
+                skipped.append(cell["build_id"])
+            elif result["binary"] in EXISTING_BINARY and not args.force_build:
+                print(f"Skipping {cell['build_id']} - package {result['package_id']} "
+                      f"already exists ({result['binary']})")
+                up_to_date.append(cell["build_id"])
+                report.count("binary_cache_hit")
+                # Possibly built earlier but never uploaded
+                if args.upload_queue and result["binary"] == "Cache" and result["prev"]:
+                    cached.append((result, cell["build_id"]))
+            else:
+                report.count("binary_cache_miss")
+                pending_cells.append(cell)
+                # Dependencies without a binary, other than our own packages
+                for node in result["missing"]:
+                    if node["name"] not in package_info:
+                        key = f"{node['ref']}:{node['package_id']}"
+                        third_party_missing.setdefault(key, []).append(cell["build_id"])
+        cells = pending_cells
+
+        # Queue the binaries of the local cache that the remote lacks
+        if cached:
+            with ThreadPoolExecutor(max_workers=min(8, len(cached))) as pool:
+                on_remote = list(pool.map(lambda c: remote_has_package(c[0], DEFAULT_REMOTE), cached))
+            for (result, build_id), present in zip(cached, on_remote):
+                if present is None:
+                    print(f"Warning: not uploading {build_id}: could not check {DEFAULT_REMOTE}",
+                          file=sys.stderr)
+                elif present:
+                    report.count("upload_already_on_remote")
                 else:
-                    cxx_std = None
+                    print(f"Queueing {build_id} for upload - package {result['package_id']} "
+                          f"not on {DEFAULT_REMOTE}")
+                    args.upload_queue.put(result, build_id)
+
+        if third_party_missing:
+            print(f"\nThird-party binaries to build: {len(third_party_missing)}")
+            for key, build_ids in sorted(third_party_missing.items()):
+                print(f"  {key} (needed by {len(build_ids)} configuration(s))")
+        report.count("third_party_missing", len(third_party_missing))
+
+        # Warm-up: build every missing third-party binary once, so that
+        # concurrent package builds do not each build it
+        if third_party_missing and not args.no_warmup:
+            needs_order = [
+                cell for cell in cells
+                if analysis[cell["build_id"]]["build_order"] is None
+                and any(node["name"] not in package_info for node in analysis[cell["build_id"]]["missing"])
+            ]
+            with ThreadPoolExecutor(max_workers=max(4, available_cpus())) as pool:
+                orders = pool.map(lambda cell: graph_build_order(
+                    cell["package"], cell["version"], cell["cxx_std"], args.build_type,
+                    cell["profile"]["path"], cell["lockfile"],
+                ), needs_order)
+                for cell, order in zip(needs_order, orders):
+                    analysis[cell["build_id"]]["build_order"] = order
+
+            plan = plan_warmup(cells, analysis, set(package_info))
+            if plan:
+                slots = max(1, min(args.jobs, len(plan)))
+                print(f"\nWarming up {len(plan)} third-party binaries, {slots} at a time...")
+                warmup_failed = run_warmup(plan, args, slots)
+                report.count("warmup_built", len(plan) - len(warmup_failed))
+                report.count("warmup_failed", len(warmup_failed))
+
+    if args.schedule == "stages":
+        package_deps = stage_dependencies(stages)
+    else:
+        package_deps = dep_graph
 
-                for version, recipe_path in version_info.items():
-                    build_id = f"{package_name}/{version}" + \
-                               (f" C++{cxx_std}" if cxx_std else "") + \
-                               f" [{profile['name']}]"
+    prefetch_build_sources(cells, args.source_cache, report)
 
-                    # Excluded combinations (see EXCLUDED_COMBINATIONS)
-                    if (package_name, version, profile["name"]) in EXCLUDED_COMBINATIONS:
-                        print(f"Skipping {build_id} - excluded combination")
-                        skipped.append(build_id)
-                        continue
-
-                    # Validate configuration
-                    if not args.skip_validation:
-                        if not check_valid_configuration(
-                            package_name, version, cxx_std,
-                            args.build_type, profile_path,
-                        ):
-                            print(f"Skipping {build_id} - invalid configuration")
-                            skipped.append(build_id)
-                            continue
-
-                    # Build
-                    success = build_package(
-                        recipe_path, version, cxx_std,
-                        args.build_type, profile_path,
-                    )
-
-                    if success:
-                        succeeded.append(build_id)
-                        if do_upload:
-                            upload_package(package_name, version)
-                    else:
-                        failed.append(build_id)
+    # Pack builds and their compile jobs into the cores and free memory
+    slots = max(1, min(args.jobs, len(cells)))
+    memory = args.max_memory * 1024 * 1024 if args.max_memory else available_memory()
+    budget = ResourceBudget(available_cpus(), memory, slots, resource_needs(package_info, history))
+    # Dependents of a failed build are cancelled by the real dependency
+    # graph, also when scheduled by stages
+    args.policy = FailurePolicy(dep_graph, args.retries, args.retry_delay, args.fail_fast)
+    scheduler = BuildScheduler(cells, package_deps, slots, budget, args.policy)
+    projected = scheduler.project()
+
+    print(f"\n{'#'*60}")
+    print(f"# BUILDING {len(cells)} configurations, up to {slots} at a time "
+          f"({budget.cpus} cores" + (f", {memory // (1024 * 1024)} MiB)" if memory else ")"))
+    print(f"{'#'*60}")
+
+    try:
+        results, actual = scheduler.run(lambda cell, jobs: run_build(cell, args, jobs))
+    except KeyboardInterrupt:
+        # Builds run in their own process groups, out of reach of Ctrl-C
+        terminate_all()
+        raise
+    for cell, status in results:
+        if status == "succeeded":
+            succeeded.append(cell["build_id"])
+        elif status == "skipped":
+            skipped.append(cell["build_id"])
+        elif status == "cancelled":
+            cancelled.append(cell["build_id"])
+        else:
+            failed.append(cell["build_id"])
+
+    upload_failed = []
+    if args.upload_queue:
+        print("\nWaiting for uploads...")
+        upload_failed = args.upload_queue.close()
+
+    if args.lockfile_dir is None:
+        shutil.rmtree(lockfile_dir, ignore_errors=True)
+
+    # Durations and peak memory of this run's builds for the next runs
+    spans = defaultdict(list)
+    for span in report.spans:
+        if span["phase"] in ("create", "test_package"):
+            spans[span["key"]].append(span)
+    history.record([
+        {
+            "package": cell["package"],
+            "version": cell["version"],
+            "profile": cell["profile"]["name"],
+            "build_type": args.build_type,
+            "status": status,
+            "duration": sum(span["duration"] for span in spans[cell["build_id"]]),
+            "peak_rss": max(
+                (span["peak_rss"] for span in spans[cell["build_id"]]
+                 if span["phase"] == "create" and span.get("peak_rss")),
+                default=None,
+            ),
+            "jobs": cell.get("jobs"),
+        }
+        for cell, status in results
+        if status in ("succeeded", "failed")
+    ])
+    history.close()
+
+    print_timeline(cells, projected, actual)
+
+    # Compiler cache hits of this run
+    ccache_hits = ccache_misses = None
+    if ccache_before is not None:
+        ccache_after = ccache_stats(args.ccache_dir) or {}
+        delta = {key: value - ccache_before.get(key, 0) for key, value in ccache_after.items()}
+        ccache_hits = delta.get("direct_cache_hit", 0) + delta.get("preprocessed_cache_hit", 0)
+        ccache_misses = delta.get("cache_miss", 0)
+        report.count("ccache_hit", ccache_hits)
+        report.count("ccache_miss", ccache_misses)
+
+    # Telemetry
+    statuses = {build_id: "skipped" for build_id in skipped}
+    statuses.update({build_id: "up_to_date" for build_id in up_to_date})
+    statuses.update({build_id: "succeeded" for build_id in succeeded})
+    statuses.update({build_id: "failed" for build_id in failed})
+    statuses.update({build_id: "cancelled" for build_id in cancelled})
+    statuses.update({build_id: "upload_failed" for build_id in upload_failed})
+    if args.report_json:
+        report.write_json(args.report_json, planned_cells, statuses)
+        print(f"\nRun report written to {args.report_json}")
+    if args.trace:
+        report.write_trace(args.trace)
+        print(f"Trace written to {args.trace}")
 
     # Summary
     print(f"\n{'='*60}")
@@ -521,18 +1552,55 @@ def main():
     for s in succeeded:
         print(f"  + {s}")
 
+    if up_to_date:
+        print(f"\nUp to date (binary exists): {len(up_to_date)}")
+        for s in up_to_date:
+            print(f"  = {s}")
+
+    if warmup_failed:
+        print(f"\nWarm-up failed (left to the package builds): {len(warmup_failed)}")
+        for pref in warmup_failed:
+            print(f"  ! {pref}")
+
     if skipped:
         print(f"\nSkipped (invalid config): {len(skipped)}")
         for s in skipped:
             print(f"  ~ {s}")
 
+    if ccache_hits is not None:
+        compilations = ccache_hits + ccache_misses
+        rate = f" ({100 * ccache_hits / compilations:.0f}% hit rate)" if compilations else ""
+        print(f"\nCompiler cache: {ccache_hits} hit(s), {ccache_misses} miss(es){rate}")
+
+    phase_totals = report.phase_totals()
+    if phase_totals:
+        print("\nTime per phase (summed over builds):")
+        for phase, seconds in phase_totals.items():
+            print(f"  {phase:<14}{seconds:10.1f}s")
+
+    if upload_failed:
+        print(f"\nUpload failed: {len(upload_failed)}")
+        for f in upload_failed:
+            print(f"  ! {f}")
+
     if failed:
+        logs = {cell["build_id"]: cell.get("log") for cell in cells}
         print(f"\nFailed: {len(failed)}")
         for f in failed:
-            print(f"  - {f}")
+            print(f"  - {f}" + (f" (log: {logs[f]})" if logs.get(f) else ""))
+
+    if cancelled:
+        print(f"\nCancelled (dependency failed or --fail-fast): {len(cancelled)}")
+        for c in cancelled:
+            print(f"  x {c}")
+
+    print(f"\nBuild logs: {log_dir}")
+
+    if failed or cancelled or upload_failed:
         sys.exit(1)
 
-    print(f"\nTotal: {len(succeeded)} succeeded, {len(skipped)} skipped, {len(failed)} failed")
+    print(f"\nTotal: {len(succeeded)} succeeded, {len(up_to_date)} up to date, "
+          f"{len(skipped)} skipped, {len(failed)} failed")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""
+Telemetry of a build run of scripts/build_packages.py.
+
+RunReport records the wall time of every phase of every build, with the
+peak memory of its process, and run-wide counters (cache hits and misses).
+It is written as a JSON report (--report-json) and as a Chrome trace-event
+file (--trace, for chrome://tracing or Perfetto).
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+class RunReport:
+    """
+    Telemetry of a build run: wall time spans of every phase, keyed by build_id
+    (or by recipe folder / reference for shared phases), and run-wide counters.
+    """
+
+    def __init__(self):
+        self.started = datetime.now(timezone.utc)
+        self.t0 = time.monotonic()
+        self.lock = threading.Lock()
+        self.spans = []
+        self.counters = defaultdict(int)
+        self.threads = {}
+
+    def record(self, phase: str, key: str, start: float, end: float, **attrs):
+        """Record a span between two time.monotonic() values."""
+        with self.lock:
+            thread = self.threads.setdefault(threading.get_ident(), len(self.threads))
+            self.spans.append({
+                "phase": phase,
+                "key": key,
+                "start": start - self.t0,
+                "duration": end - start,
+                "thread": thread,
+                **attrs,
+            })
+
+    @contextmanager
+    def span(self, phase: str, key: str, **attrs):
+        """Time a phase; the yielded dict can be filled with extra attributes."""
+        start = time.monotonic()
+        try:
+            yield attrs
+        finally:
+            self.record(phase, key, start, time.monotonic(), **attrs)
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] += n
+
+    def build_summary(self, cells: list[dict], statuses: dict[str, str]) -> dict:
+        """
+        Per build_id: status, seconds spent in each phase and peak RSS.
+        Shared phases (inspect, export) are attributed to every build using them.
+        """
+        by_key = defaultdict(list)
+        for span in self.spans:
+            by_key[span["key"]].append(span)
+
+        builds = {}
+        for cell in cells:
+            keys = [
+                str(cell["recipe_path"]),
+                f"{cell['package']}/{cell['version']}",
+                cell["build_id"],
+            ]
+            phases = defaultdict(float)
+            peak_rss = None
+            for key in keys:
+                for span in by_key[key]:
+                    phases[span["phase"]] += span["duration"]
+                    if span.get("peak_rss") is not None:
+                        peak_rss = max(peak_rss or 0, span["peak_rss"])
+            builds[cell["build_id"]] = {
+                "package": cell["package"],
+                "version": cell["version"],
+                "profile": cell["profile"]["name"],
+                "status": statuses.get(cell["build_id"]),
+                "phases": dict(phases),
+                "peak_rss": peak_rss,
+            }
+        return builds
+
+    def phase_totals(self) -> dict[str, float]:
+        totals = defaultdict(float)
+        for span in self.spans:
+            totals[span["phase"]] += span["duration"]
+        return dict(totals)
+
+    def write_json(self, path: Path, cells: list[dict], statuses: dict[str, str]):
+        data = {
+            "started": self.started.isoformat(),
+            "duration": time.monotonic() - self.t0,
+            "counters": dict(self.counters),
+            "phases": self.phase_totals(),
+            "builds": self.build_summary(cells, statuses),
+            "spans": self.spans,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def write_trace(self, path: Path):
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+             "args": {"name": "main" if tid == 0 else f"worker {tid}"}}
+            for tid in sorted(set(self.threads.values()))
+        ]
+        for span in self.spans:
+            args = {k: v for k, v in span.items()
+                    if k not in ("phase", "key", "start", "duration", "thread")}
+            events.append({
+                "name": f"{span['phase']} {span['key']}",
+                "cat": span["phase"],
+                "ph": "X",
+                "ts": round(span["start"] * 1e6),
+                "dur": round(span["duration"] * 1e6),
+                "pid": 1,
+                "tid": span["thread"],
+                "args": args,
+            })
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def print_timeline(
+    cells: list[dict],
+    projected: dict[str, tuple[float, float]],
+    actual: dict[str, tuple[float, float]],
+):
+    """Print projected vs actual start/end of every cell that was run."""
+    rows = sorted(
+        (cell["build_id"] for cell in cells if cell["build_id"] in actual),
+        key=lambda build_id: actual[build_id][0],
+    )
+    if not rows:
+        return
+
+    width = max(len(build_id) for build_id in rows)
+    print(f"\n{'='*60}")
+    print("TIMELINE (seconds from start: projected | actual)")
+    print(f"{'='*60}")
+    for build_id in rows:
+        p_start, p_end = projected.get(build_id, (0.0, 0.0))
+        a_start, a_end = actual[build_id]
+        print(f"  {build_id:<{width}}  {p_start:8.1f} -{p_end:8.1f}  |"
+              f"  {a_start:8.1f} -{a_end:8.1f}")
+
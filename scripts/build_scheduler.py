@@ -0,0 +1,603 @@
+"""
+Scheduling of the builds of scripts/build_packages.py.
+
+Builds are ordered by the package dependency graph, longest dependency
+chain first, and packed into the machine's cores and memory
+(BuildScheduler, ResourceBudget). FailurePolicy retries transient failures
+and cancels the dependents of a failed build. The build matrix is split
+into cost-balanced shards for several CI runners (shard_cells()).
+"""
+
+import heapq
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from build_history import BuildHistory
+from build_log import print_locked, terminate_all
+
+# Rough duration of a single package build in seconds, for configurations
+# without a build history. Only the relative weights matter: they decide
+# which dependency chain is started first and how shards are balanced.
+DEFAULT_BUILD_ESTIMATE = 600.0
+BUILD_ESTIMATES: dict[str, float] = {
+    "actor-zeta": 300.0,
+    "otterbrix": 1800.0,
+}
+
+# Memory assumed per compile job, and for Conan/CMake themselves, of a
+# package without build_resources in config.yml nor a build history
+DEFAULT_MEMORY_PER_JOB = 1024 * 1024 * 1024
+DEFAULT_BASE_MEMORY = 512 * 1024 * 1024
+
+# Headroom on the peak RSS of a compile job measured in earlier runs
+PEAK_RSS_MARGIN = 1.25
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may use."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory() -> int | None:
+    """Memory in bytes available for new processes, or None if unknown."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    # macOS and others: physical memory
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def resource_needs(package_info: dict, history: BuildHistory | None = None) -> dict[str, dict]:
+    """
+    Memory per compile job, base memory and maximum compile jobs of every package,
+    from the build history, else the build_resources hints of config.yml, else defaults.
+    Returns dict: package -> {'memory_per_job', 'base_memory', 'max_jobs'}
+    """
+    needs = {}
+    for package_name, info in package_info.items():
+        hints = info.get("resources") or {}
+        learned = history.peak_rss(package_name) if history else None
+        if learned:
+            memory_per_job = int(learned * PEAK_RSS_MARGIN)
+        else:
+            memory_per_job = hints.get("memory_per_job") or DEFAULT_MEMORY_PER_JOB
+        needs[package_name] = {
+            "memory_per_job": memory_per_job,
+            "base_memory": hints.get("base_memory") or DEFAULT_BASE_MEMORY,
+            "max_jobs": hints.get("max_jobs"),
+        }
+    return needs
+
+
+def split_build_jobs(concurrent_builds: int) -> int | None:
+    """
+    Split CPU cores across concurrent builds.
+    Returns the tools.build:jobs value for each build, or None when a single
+    build runs at a time (Conan then uses all cores by itself).
+    """
+    if concurrent_builds <= 1:
+        return None
+    return max(1, available_cpus() // concurrent_builds)
+
+
+def topological_sort(packages: dict[str, set[str]]) -> list[list[str]]:
+    """
+    Perform topological sort on packages based on dependencies.
+    Returns list of stages, where each stage contains packages
+    that can be built in parallel (no inter-dependencies).
+    """
+    in_degree = defaultdict(int)
+    dependents = defaultdict(set)
+    all_packages = set(packages.keys())
+
+    for pkg, deps in packages.items():
+        local_deps = deps & all_packages
+        in_degree[pkg] = len(local_deps)
+        for dep in local_deps:
+            dependents[dep].add(pkg)
+
+    stages = []
+    remaining = set(all_packages)
+
+    while remaining:
+        ready = [pkg for pkg in remaining if in_degree[pkg] == 0]
+
+        if not ready:
+            print(f"Warning: circular dependency detected among: {remaining}", file=sys.stderr)
+            stages.append(list(remaining))
+            break
+
+        stages.append(sorted(ready))
+
+        for pkg in ready:
+            remaining.remove(pkg)
+            for dependent in dependents[pkg]:
+                if dependent in remaining:
+                    in_degree[dependent] -= 1
+
+    return stages
+
+
+def estimate_build_time(cell: dict) -> float:
+    """
+    Estimated duration of a cell build in seconds: the one from the build
+    history ('estimate', see BuildHistory.estimate), else a rough default.
+    """
+    return cell.get("estimate") or BUILD_ESTIMATES.get(cell["package"], DEFAULT_BUILD_ESTIMATE)
+
+
+def invert_dependencies(package_deps: dict[str, set[str]]) -> dict[str, set[str]]:
+    """Map each package to the set of packages that depend on it."""
+    dependents = defaultdict(set)
+    for pkg, deps in package_deps.items():
+        for dep in deps:
+            if dep in package_deps:
+                dependents[dep].add(pkg)
+    return dependents
+
+
+def critical_path_priorities(
+    cells: list[dict],
+    package_deps: dict[str, set[str]],
+) -> dict[str, float]:
+    """
+    Compute the critical-path priority of every cell: its own estimated
+    duration plus the longest chain of dependent package builds after it.
+    Returns dict: build_id -> priority.
+    """
+    longest_cell = defaultdict(float)
+    for cell in cells:
+        pkg = cell["package"]
+        longest_cell[pkg] = max(longest_cell[pkg], estimate_build_time(cell))
+
+    dependents = invert_dependencies(package_deps)
+    tail = {}
+
+    def chain(pkg: str, visiting: frozenset = frozenset()) -> float:
+        # Longest chain of builds starting at pkg (inclusive)
+        if pkg in tail:
+            return tail[pkg]
+        if pkg in visiting:
+            return 0.0
+        after = max(
+            (chain(d, visiting | {pkg}) for d in dependents[pkg]),
+            default=0.0,
+        )
+        tail[pkg] = longest_cell[pkg] + after
+        return tail[pkg]
+
+    priorities = {}
+    for cell in cells:
+        after = max(
+            (chain(d) for d in dependents[cell["package"]]),
+            default=0.0,
+        )
+        priorities[cell["build_id"]] = estimate_build_time(cell) + after
+    return priorities
+
+
+class ResourceBudget:
+    """
+    CPU cores and memory shared by concurrent builds.
+    Each build gets a fair share of the free cores as its tools.build:jobs, as far as
+    its compile jobs fit in the free memory.
+    """
+
+    def __init__(self, cpus: int, memory: int | None, slots: int, needs: dict[str, dict]):
+        self.cpus = cpus
+        self.memory = memory
+        self.slots = max(1, slots)
+        self.needs = needs
+        self.reset()
+
+    def reset(self):
+        self.free_cpus = self.cpus
+        self.free_memory = self.memory
+        self.running = 0
+
+    def _need(self, cell: dict) -> dict:
+        return self.needs.get(cell["package"]) or {
+            "memory_per_job": DEFAULT_MEMORY_PER_JOB,
+            "base_memory": DEFAULT_BASE_MEMORY,
+            "max_jobs": None,
+        }
+
+    def acquire(self, cell: dict, force: bool = False, waiting: int = 1) -> int:
+        """
+        Reserve resources for a build, one of `waiting` builds ready to
+        start (itself included). Returns its number of compile jobs, or 0
+        if it does not fit (at least 1 when force).
+        """
+        need = self._need(cell)
+        starting = max(1, min(waiting, self.slots - self.running))
+        jobs = min(max(1, self.free_cpus // starting), self.free_cpus)
+        if need["max_jobs"]:
+            jobs = min(jobs, need["max_jobs"])
+        if self.free_memory is not None:
+            jobs = min(jobs, (self.free_memory - need["base_memory"]) // need["memory_per_job"])
+        if jobs < 1:
+            if not force:
+                return 0
+            jobs = 1
+        self.free_cpus -= jobs
+        self.running += 1
+        if self.free_memory is not None:
+            self.free_memory -= need["base_memory"] + jobs * need["memory_per_job"]
+        return jobs
+
+    def release(self, cell: dict, jobs: int):
+        need = self._need(cell)
+        self.free_cpus += jobs
+        self.running -= 1
+        if self.free_memory is not None:
+            self.free_memory += need["base_memory"] + jobs * need["memory_per_job"]
+
+
+class FailurePolicy:
+    """
+    What happens to the rest of the run when a build fails: transient failures are
+    retried with exponential backoff, dependents of a failed build are cancelled, and
+    with fail_fast the first hard failure stops every build.
+    """
+
+    def __init__(
+        self,
+        package_deps: dict[str, set[str]],
+        retries: int = 0,
+        retry_delay: float = 0.0,
+        fail_fast: bool = False,
+    ):
+        self.package_deps = package_deps
+        self.retries = retries
+        self.base_delay = retry_delay
+        self.fail_fast = fail_fast
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.failed = defaultdict(dict)  # (package, profile) -> version -> build_id
+
+    def retry_delay(self, attempt: int) -> float | None:
+        """Seconds to wait before retry number attempt + 1, or None to give up."""
+        if attempt >= self.retries or self.stopped.is_set():
+            return None
+        return self.base_delay * 2 ** attempt
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep before a retry. Returns False if the run was stopped meanwhile."""
+        return not self.stopped.wait(seconds)
+
+    def record_failure(self, cell: dict, cancelled: bool = False):
+        """Record a failed (or cancelled) build; stops the run with fail_fast."""
+        with self.lock:
+            self.failed[(cell["package"], cell["profile"]["name"])][cell["version"]] = cell["build_id"]
+        if self.fail_fast and not cancelled and not self.stopped.is_set():
+            self.stopped.set()
+            print_locked(f"\n{cell['build_id']} failed, stopping all builds (--fail-fast)", file=sys.stderr)
+            terminate_all()
+
+    def cancelled_by(self, cell: dict) -> str | None:
+        """
+        Why a build must not start: the build_id of the failed build it
+        depends on, 'fail-fast' when the run was stopped, or None.
+        """
+        if self.stopped.is_set():
+            return "fail-fast"
+        requires = cell.get("requires")
+        with self.lock:
+            for dep in sorted(self.package_deps.get(cell["package"], ())):
+                failed = self.failed.get((dep, cell["profile"]["name"]), {})
+                for version, build_id in sorted(failed.items()):
+                    if requires is None or f"{dep}/{version}" in requires:
+                        return build_id
+        return None
+
+
+class BuildScheduler:
+    """
+    Ready-queue scheduler over the package dependency graph: a package's cells start
+    once its local dependencies are built, in critical-path order, up to `slots` at a
+    time, within the ResourceBudget and FailurePolicy when given.
+    """
+
+    def __init__(
+        self,
+        cells: list[dict],
+        package_deps: dict[str, set[str]],
+        slots: int,
+        budget: ResourceBudget | None = None,
+        policy: FailurePolicy | None = None,
+    ):
+        self.cells = cells
+        self.slots = max(1, slots)
+        self.budget = budget
+        self.policy = policy
+        self.priorities = critical_path_priorities(cells, package_deps)
+        self.order = {cell["build_id"]: i for i, cell in enumerate(cells)}
+        self.by_id = {cell["build_id"]: cell for cell in cells}
+
+        self.remaining = defaultdict(int)
+        for cell in cells:
+            self.remaining[cell["package"]] += 1
+
+        # Only dependencies that still have cells to build can block a package
+        self.waiting = {
+            pkg: {d for d in package_deps.get(pkg, set()) if d in self.remaining and d != pkg}
+            for pkg in self.remaining
+        }
+        self.dependents = invert_dependencies(self.waiting)
+
+    def _sort_key(self, cell: dict) -> tuple[float, int]:
+        return (-self.priorities[cell["build_id"]], self.order[cell["build_id"]])
+
+    def _release(self, pkg: str, ready: list):
+        for cell in self.cells:
+            if cell["package"] == pkg:
+                heapq.heappush(ready, (self._sort_key(cell), cell["build_id"]))
+
+    def _next(self, ready: list, idle: bool) -> tuple[str, int | None] | None:
+        """
+        Take the first ready cell, in priority order, that fits the budget.
+        When idle (nothing running) the first one is started regardless.
+        Returns (build_id, compile jobs), or None if none fits.
+        """
+        if self.budget is None:
+            _, build_id = heapq.heappop(ready)
+            return build_id, split_build_jobs(self.slots)
+
+        for entry in sorted(ready):
+            jobs = self.budget.acquire(self.by_id[entry[1]], force=idle, waiting=len(ready))
+            if jobs:
+                ready.remove(entry)
+                heapq.heapify(ready)
+                return entry[1], jobs
+        return None
+
+    def _done(self, build_id: str, jobs: int | None):
+        if self.budget is not None:
+            self.budget.release(self.by_id[build_id], jobs)
+
+    def _finish(self, build_id: str, ready: list):
+        """Count a cell as finished; release its package's dependents after the last one."""
+        pkg = self.by_id[build_id]["package"]
+        self.remaining[pkg] -= 1
+        if self.remaining[pkg] == 0:
+            for dependent in sorted(self.dependents[pkg]):
+                self.waiting[dependent].discard(pkg)
+                if not self.waiting[dependent]:
+                    self._release(dependent, ready)
+
+    def _cancel_ready(self, ready: list, statuses: dict[str, str]):
+        """Finish the ready cells that the failure policy cancels, transitively."""
+        if self.policy is None:
+            return
+        while True:
+            cancelled = [
+                (entry, reason) for entry in ready
+                if (reason := self.policy.cancelled_by(self.by_id[entry[1]]))
+            ]
+            if not cancelled:
+                return
+            for entry, reason in cancelled:
+                ready.remove(entry)
+                build_id = entry[1]
+                if reason != "fail-fast":
+                    print_locked(f"Cancelling {build_id} - dependency {reason} failed")
+                statuses[build_id] = "cancelled"
+                self.policy.record_failure(self.by_id[build_id], cancelled=True)
+                self._finish(build_id, ready)
+            heapq.heapify(ready)
+
+    def project(self) -> dict[str, tuple[float, float]]:
+        """
+        Simulate the schedule using estimated durations.
+        Returns dict: build_id -> (start, end) in seconds from start.
+        """
+        by_id = self.by_id
+        waiting = {pkg: set(deps) for pkg, deps in self.waiting.items()}
+        remaining = dict(self.remaining)
+        ready = []
+        for pkg, deps in waiting.items():
+            if not deps:
+                self._release(pkg, ready)
+
+        if self.budget is not None:
+            self.budget.reset()
+        timeline = {}
+        running = []  # heap of (end, build_id, jobs)
+        now = 0.0
+        while ready or running:
+            while ready and len(running) < self.slots:
+                picked = self._next(ready, idle=not running)
+                if picked is None:
+                    break
+                build_id, jobs = picked
+                end = now + estimate_build_time(by_id[build_id])
+                timeline[build_id] = (now, end)
+                heapq.heappush(running, (end, build_id, jobs))
+            if not running:
+                break
+            now, build_id, jobs = heapq.heappop(running)
+            self._done(build_id, jobs)
+            pkg = by_id[build_id]["package"]
+            remaining[pkg] -= 1
+            if remaining[pkg] == 0:
+                for dependent in sorted(self.dependents[pkg]):
+                    waiting[dependent].discard(pkg)
+                    if not waiting[dependent]:
+                        self._release(dependent, ready)
+        return timeline
+
+    def run(self, run_cell) -> tuple[list[tuple[dict, str]], dict[str, tuple[float, float]]]:
+        """
+        Execute all cells.
+        Returns ((cell, status) pairs in the order of cells,
+                 dict: build_id -> (start, end) actual seconds from start).
+        """
+        by_id = self.by_id
+        ready = []
+        for pkg, deps in self.waiting.items():
+            if not deps:
+                self._release(pkg, ready)
+
+        if self.budget is not None:
+            self.budget.reset()
+        statuses = {}
+        timeline = {}
+        running = {}  # future -> (build_id, jobs)
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.slots) as pool:
+            while len(statuses) < len(self.cells):
+                self._cancel_ready(ready, statuses)
+                while ready and len(running) < self.slots:
+                    picked = self._next(ready, idle=not running)
+                    if picked is None:
+                        break
+                    build_id, jobs = picked
+                    timeline[build_id] = (time.monotonic() - started, None)
+                    running[pool.submit(run_cell, by_id[build_id], jobs)] = (build_id, jobs)
+
+                if not running:
+                    if len(statuses) == len(self.cells):
+                        break
+                    blocked = sorted(p for p, deps in self.waiting.items() if deps)
+                    print_locked(f"Warning: circular dependency detected among: {blocked}",
+                                 file=sys.stderr)
+                    for pkg in blocked:
+                        self.waiting[pkg] = set()
+                        self._release(pkg, ready)
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    build_id, jobs = running.pop(future)
+                    self._done(build_id, jobs)
+                    statuses[build_id] = future.result()
+                    timeline[build_id] = (timeline[build_id][0], time.monotonic() - started)
+                    self._finish(build_id, ready)
+
+        results = [(cell, statuses[cell["build_id"]]) for cell in self.cells]
+        return results, timeline
+
+
+def stage_dependencies(stages: list[list[str]]) -> dict[str, set[str]]:
+    """
+    Dependencies that reproduce a stage barrier: every package waits
+    for all packages of the previous stages.
+    """
+    deps = {}
+    before = set()
+    for stage_packages in stages:
+        for pkg in stage_packages:
+            deps[pkg] = set(before)
+        before |= set(stage_packages)
+    return deps
+
+
+def cell_dependencies(cells: list[dict], package_deps: dict[str, set[str]]) -> dict[str, list[str]]:
+    """
+    Cells of the local dependency packages of every cell, with the same profile and at
+    the versions the cell requires (every version when unknown).
+    Returns dict: build_id -> build_ids, in the order of cells.
+    """
+    by_package = defaultdict(list)
+    for cell in cells:
+        by_package[(cell["package"], cell["profile"]["name"])].append(cell)
+
+    deps = {}
+    for cell in cells:
+        requires = cell.get("requires")
+        deps[cell["build_id"]] = [
+            dep["build_id"]
+            for pkg in sorted(package_deps.get(cell["package"], ()))
+            if pkg != cell["package"]
+            for dep in by_package[(pkg, cell["profile"]["name"])]
+            if requires is None or f"{pkg}/{dep['version']}" in requires
+        ]
+    return deps
+
+
+def connected_cells(cells: list[dict], deps: dict[str, list[str]]) -> list[list[dict]]:
+    """
+    Group cells linked by a dependency, directly or not (union-find).
+    Returns the groups, ordered by their first cell, each in the order of cells.
+    """
+    parent = {cell["build_id"]: cell["build_id"] for cell in cells}
+
+    def find(build_id: str) -> str:
+        while parent[build_id] != build_id:
+            parent[build_id] = parent[parent[build_id]]
+            build_id = parent[build_id]
+        return build_id
+
+    for build_id, dep_ids in deps.items():
+        for dep_id in dep_ids:
+            root, dep_root = find(build_id), find(dep_id)
+            if root != dep_root:
+                parent[dep_root] = root
+
+    groups = {}
+    for cell in cells:
+        groups.setdefault(find(cell["build_id"]), []).append(cell)
+    return list(groups.values())
+
+
+def shard_cells(cells: list[dict], package_deps: dict[str, set[str]], count: int) -> list[list[dict]]:
+    """
+    Partition cells into `count` cost-balanced shards, keeping linked cells together
+    (longest processing time first). Deterministic, so every runner computes the same one.
+    Returns the cells of each shard, in the order of cells.
+    """
+    order = {cell["build_id"]: i for i, cell in enumerate(cells)}
+    groups = [
+        (sum(estimate_build_time(cell) for cell in group), group)
+        for group in connected_cells(cells, cell_dependencies(cells, package_deps))
+    ]
+    groups.sort(key=lambda entry: (-entry[0], order[entry[1][0]["build_id"]]))
+
+    loads = [0.0] * count
+    shards = [[] for _ in range(count)]
+    for cost, group in groups:
+        index = min(range(count), key=lambda i: (loads[i], i))
+        loads[index] += cost
+        shards[index].extend(group)
+    return [sorted(shard, key=lambda cell: order[cell["build_id"]]) for shard in shards]
+
+
+def build_matrix(cells: list[dict], package_deps: dict[str, set[str]]) -> dict:
+    """
+    The build cells as written by --list-matrix: every cell with the cells
+    it depends on and its estimated duration, plus the number of groups of
+    linked cells, i.e. the most shards worth running.
+    """
+    deps = cell_dependencies(cells, package_deps)
+    return {
+        "components": len(connected_cells(cells, deps)),
+        "cells": [
+            {
+                "build_id": cell["build_id"],
+                "package": cell["package"],
+                "version": cell["version"],
+                "profile": cell["profile"]["name"],
+                "cxx_std": cell["cxx_std"],
+                "recipe_path": str(cell["recipe_path"]),
+                "depends": deps[cell["build_id"]],
+                "estimate": estimate_build_time(cell),
+            }
+            for cell in cells
+        ],
+    }
+
@@ -0,0 +1,399 @@
+"""
+Analysis of the Conan dependency graph of build configurations.
+
+GraphAnalyzer resolves the graph of every configuration to build, in a
+single Conan API session where possible: whether the configuration is
+valid, whether its binary already exists, the lockfile its build uses and
+the third-party binaries it needs to build. plan_warmup() merges the
+latter so each is built once.
+"""
+
+import json
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from build_log import run_logged
+from build_report import RunReport
+
+# Binary status (from graph analysis) of a package that does not need a build
+EXISTING_BINARY = {"Cache", "Download", "Update"}
+
+
+def configuration_args(
+    package_name: str,
+    cxx_standard: int | None,
+    build_type: str,
+    profile_path: Path | None,
+    build_jobs: int | None,
+    lockfile: Path | None = None,
+) -> list[str]:
+    """Settings, profile, options, conf and lockfile arguments of a build configuration."""
+    args = ["-s", f"build_type={build_type}"]
+
+    if profile_path is not None:
+        args.extend(["-pr:h", str(profile_path)])
+
+    if cxx_standard is not None:
+        args.extend(["-o", f"{package_name}/*:cxx_standard={cxx_standard}"])
+
+    if build_jobs is not None:
+        args.extend(["-c", f"tools.build:jobs={build_jobs}"])
+
+    if lockfile is not None:
+        # Partial: the test_package and profile tool_requires are not locked
+        args.extend([f"--lockfile={lockfile}", "--lockfile-partial"])
+
+    return args
+
+
+def check_valid_configuration(
+    package_name: str,
+    version: str,
+    cxx_standard: int | None,
+    build_type: str = "Release",
+    profile_path: Path | None = None,
+    lockfile_out: Path | None = None,
+) -> dict:
+    """
+    Check if configuration is valid using a conan graph info process.
+    Requires recipe to be exported first; the graph is locked into lockfile_out when given.
+    Returns a graph_result() dict.
+    """
+    cmd = [
+        "conan", "graph", "info",
+        f"--requires={package_name}/{version}",
+        "-s", f"build_type={build_type}",
+        "--build=missing",
+        "--format=json",
+    ]
+
+    if profile_path is not None:
+        cmd.extend(["-pr:h", str(profile_path)])
+
+    if cxx_standard is not None:
+        cmd.extend(["-o", f"{package_name}/*:cxx_standard={cxx_standard}"])
+
+    if lockfile_out is not None:
+        cmd.append(f"--lockfile-out={lockfile_out}")
+
+    try:
+        result = run_logged(
+            cmd, f"validate {package_name}/{version}", output="quiet",
+            capture_stdout=True, tail_lines=5, timeout=120,
+        )
+        if result["timed_out"]:
+            raise subprocess.TimeoutExpired(cmd, 120)
+
+        if result["returncode"] == 0:
+            nodes = json.loads(result["stdout"]).get("graph", {}).get("nodes", {})
+            analysis = graph_result(package_name, version, [
+                {
+                    "ref": node.get("ref", ""),
+                    "name": node.get("name"),
+                    "version": node.get("version"),
+                    "binary": node.get("binary"),
+                    "package_id": node.get("package_id"),
+                    "prev": node.get("prev"),
+                    "invalid": node.get("info_invalid"),
+                }
+                for node in nodes.values()
+                if node.get("ref")
+            ])
+            if lockfile_out is not None and lockfile_out.exists():
+                analysis["lockfile"] = lockfile_out
+            return analysis
+
+        # Print last few lines of output for diagnostics
+        lines = [line for line in result["tail"] if line.strip()]
+        print(f"  validate {package_name}/{version}: returncode={result['returncode']}",
+              file=sys.stderr)
+        for line in lines:
+            print(f"    {line}", file=sys.stderr)
+        reason = result["invalid"] or (lines[-1] if lines else f"returncode={result['returncode']}")
+
+    except subprocess.TimeoutExpired:
+        print(f"Warning: timeout checking {package_name}/{version}", file=sys.stderr)
+        reason = "timeout"
+    except Exception as e:
+        print(f"Warning: error checking {package_name}/{version}: {e}", file=sys.stderr)
+        reason = str(e)
+
+    return invalid_result(reason)
+
+
+def graph_build_order(
+    package_name: str,
+    version: str,
+    cxx_standard: int | None,
+    build_type: str = "Release",
+    profile_path: Path | None = None,
+    lockfile: Path | None = None,
+) -> list[dict] | None:
+    """
+    Binaries a configuration needs to build, using a conan graph build-order
+    process. Returns build_order_items(), or None if it failed.
+    """
+    cmd = [
+        "conan", "graph", "build-order",
+        f"--requires={package_name}/{version}",
+        "--order-by=configuration",
+        "--build=missing",
+        "--reduce",
+        "--format=json",
+        *configuration_args(package_name, cxx_standard, build_type, profile_path, None, lockfile),
+    ]
+    try:
+        result = run_logged(
+            cmd, f"build-order {package_name}/{version}", output="quiet",
+            capture_stdout=True, tail_lines=1, timeout=120,
+        )
+        if result["returncode"] == 0:
+            return build_order_items(json.loads(result["stdout"]).get("order", []))
+        if result["timed_out"]:
+            reason = "timeout"
+        else:
+            reason = result["tail"][0] if result["tail"] else f"returncode={result['returncode']}"
+    except Exception as e:
+        reason = str(e)
+    print(f"Warning: build order of {package_name}/{version} failed: {reason}", file=sys.stderr)
+    return None
+
+
+def build_order_items(order: list[list[dict]]) -> list[dict]:
+    """
+    Flatten a reduced conan build order into the binaries to build, dependencies first.
+    Returns list of dicts with 'ref', 'pref', 'depends' (prefs) and 'build_args' keys.
+    """
+    return [
+        {
+            "ref": item["ref"],
+            "pref": item["pref"],
+            "depends": list(item.get("depends") or []),
+            "build_args": item.get("build_args") or "",
+        }
+        for level in order
+        for item in level
+        if item.get("binary") == "Build"
+    ]
+
+
+def invalid_result(reason: str) -> dict:
+    """Analysis result of a configuration that could not be resolved."""
+    return {"valid": False, "reason": reason, "ref": None, "package_id": None,
+            "prev": None, "binary": None, "missing": [], "lockfile": None,
+            "build_order": None, "requires": None}
+
+
+def graph_result(package_name: str, version: str, nodes: list[dict]) -> dict:
+    """
+    Analysis result of a configuration from the nodes of its resolved graph.
+    Returns dict with 'valid', 'reason', 'ref', 'package_id', 'prev', 'binary', 'missing',
+    'requires', 'lockfile' and 'build_order' keys.
+    """
+    result = {"valid": True, "reason": None, "ref": None, "package_id": None,
+              "prev": None, "binary": None, "missing": [], "lockfile": None,
+              "build_order": None, "requires": set()}
+
+    for node in nodes:
+        if node["name"] == package_name and node["version"] == version:
+            for key in ("ref", "package_id", "prev", "binary"):
+                result[key] = node[key]
+            continue
+        if node["name"] and node["version"]:
+            result["requires"].add(f"{node['name']}/{node['version']}")
+        if node["binary"] in ("Missing", "Build"):
+            result["missing"].append(node)
+
+    for node in nodes:
+        if node["binary"] == "Invalid":
+            result["valid"] = False
+            result["reason"] = f"{node['ref']}: {node['invalid']}" if node["ref"] else node["invalid"]
+            break
+
+    return result
+
+
+class GraphAnalyzer:
+    """
+    Evaluates build configurations against the Conan dependency graph, in a single
+    Conan API session, or one conan graph info process per configuration when the
+    Conan Python API is not importable.
+    """
+
+    def __init__(
+        self,
+        build_type: str,
+        workers: int = 1,
+        report: RunReport | None = None,
+        lockfile_dir: Path | None = None,
+    ):
+        self.build_type = build_type
+        self.workers = max(1, workers)
+        self.report = report or RunReport()
+        self.lockfile_dir = lockfile_dir
+        self.api = None
+        self.remotes = []
+        self.profiles = {}
+
+        try:
+            from conan.api.conan_api import ConanAPI
+            from conan.api.output import ConanOutput
+        except ImportError:
+            return
+        try:
+            from conan.internal.graph.install_graph import InstallGraph
+            self.InstallGraph = InstallGraph
+        except ImportError:
+            # Build orders are then computed by conan graph build-order
+            self.InstallGraph = None
+
+        ConanOutput.define_log_level("error")
+        try:
+            api = ConanAPI()
+            self.remotes = api.remotes.list()
+            self.profile_build = api.profiles.get_profile([api.profiles.get_default_build()])
+        except Exception as e:
+            print(f"Warning: failed to start Conan API session: {e}", file=sys.stderr)
+            return
+        self.api = api
+
+    @property
+    def in_process(self) -> bool:
+        return self.api is not None
+
+    def lockfile_path(self, cell: dict) -> Path | None:
+        """Lockfile of a (package, version, profile) configuration."""
+        if self.lockfile_dir is None:
+            return None
+        return self.lockfile_dir / f"{cell['package']}-{cell['version']}-{cell['profile']['name']}.lock"
+
+    def _profile_host(self, cell: dict):
+        profile_path = cell["profile"]["path"]
+        options = []
+        if cell["cxx_std"] is not None:
+            options.append(f"{cell['package']}/*:cxx_standard={cell['cxx_std']}")
+        key = (profile_path, tuple(options))
+        if key not in self.profiles:
+            base = str(profile_path) if profile_path else self.api.profiles.get_default_host()
+            self.profiles[key] = self.api.profiles.get_profile(
+                [base], settings=[f"build_type={self.build_type}"], options=options,
+            )
+        return self.profiles[key]
+
+    def _analyze_in_process(self, cell: dict) -> dict:
+        ref = f"{cell['package']}/{cell['version']}"
+        try:
+            graph = self.api.graph.load_graph_requires(
+                [ref], None, self._profile_host(cell), self.profile_build,
+                lockfile=None, remotes=self.remotes, update=False,
+            )
+            if graph.error:
+                return invalid_result(str(graph.error))
+            self.api.graph.analyze_binaries(graph, ["missing"], remotes=self.remotes)
+        except Exception as e:
+            print(f"Warning: error checking {ref}: {e}", file=sys.stderr)
+            return invalid_result(str(e))
+
+        result = graph_result(cell["package"], cell["version"], [
+            {
+                "ref": node.ref.repr_notime() if node.ref else "",
+                "name": node.ref.name if node.ref else None,
+                "version": str(node.ref.version) if node.ref else None,
+                "binary": node.binary,
+                "package_id": node.package_id,
+                "prev": node.prev,
+                "invalid": getattr(node.conanfile.info, "invalid", None),
+            }
+            for node in graph.nodes
+            if node.ref
+        ])
+
+        if result["valid"] and self.InstallGraph is not None:
+            try:
+                install_graph = self.InstallGraph(graph, order_by="configuration")
+                install_graph.reduce()
+                result["build_order"] = build_order_items(install_graph.install_build_order()["order"])
+            except Exception as e:
+                print(f"Warning: failed to compute build order of {ref}: {e}", file=sys.stderr)
+
+        lockfile_path = self.lockfile_path(cell)
+        if lockfile_path is not None and result["valid"]:
+            try:
+                lockfile = self.api.lockfile.update_lockfile(None, graph)
+                self.api.lockfile.save_lockfile(lockfile, str(lockfile_path))
+                result["lockfile"] = lockfile_path
+            except Exception as e:
+                print(f"Warning: failed to write lockfile of {ref}: {e}", file=sys.stderr)
+        return result
+
+    def _analyze_subprocess(self, cell: dict) -> dict:
+        return check_valid_configuration(
+            cell["package"], cell["version"], cell["cxx_std"],
+            self.build_type, cell["profile"]["path"], self.lockfile_path(cell),
+        )
+
+    def analyze(self, cells: list[dict]) -> dict[str, dict]:
+        """
+        Evaluate all cells. Recipes must be exported first.
+        Binaries are looked up in the local cache and every enabled remote.
+        Returns dict: build_id -> graph_result() dict
+        """
+        if self.lockfile_dir is not None:
+            self.lockfile_dir.mkdir(parents=True, exist_ok=True)
+        analyze_one = self._analyze_in_process if self.in_process else self._analyze_subprocess
+
+        def analyze(cell: dict) -> dict:
+            with self.report.span("validate", cell["build_id"]) as span:
+                result = analyze_one(cell)
+                span["binary"] = result["binary"]
+            return result
+
+        if self.in_process:
+            return {cell["build_id"]: analyze(cell) for cell in cells}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = pool.map(analyze, cells)
+            return {cell["build_id"]: result for cell, result in zip(cells, results)}
+
+
+def find_package_node(graph: dict, package_name: str, version: str) -> dict | None:
+    """
+    Find a package in a serialized Conan graph (--format=json output).
+    Returns dict with 'ref' (including recipe revision), 'package_id' and
+    'prev' keys, or None if not found.
+    """
+    for node in graph.get("graph", {}).get("nodes", {}).values():
+        if node.get("name") == package_name and node.get("version") == version:
+            return {
+                "ref": node.get("ref"),
+                "package_id": node.get("package_id"),
+                "prev": node.get("prev"),
+            }
+    return None
+
+
+def plan_warmup(cells: list[dict], analysis: dict[str, dict], local_packages: set[str]) -> dict[str, dict]:
+    """
+    Merge the build orders of all cells into the third-party binaries to build, each once.
+    Returns dict: pref -> build_order_items() entry with 'cell' (first cell needing it)
+    and 'needed_by' (build_ids), dependencies first.
+    """
+    plan = {}
+    excluded = set()
+    for cell in cells:
+        for item in analysis[cell["build_id"]].get("build_order") or []:
+            pref = item["pref"]
+            name = item["ref"].split("/")[0]
+            if pref in excluded or name in local_packages or any(d in excluded for d in item["depends"]):
+                excluded.add(pref)
+                continue
+            if pref not in plan:
+                plan[pref] = {**item, "cell": cell, "needed_by": []}
+            plan[pref]["needed_by"].append(cell["build_id"])
+
+    for item in plan.values():
+        item["depends"] = [d for d in item["depends"] if d in plan]
+    return plan
+
@@ -0,0 +1,158 @@
+"""
+Upload of built packages to a Conan remote.
+
+Exactly the package revisions that were built are uploaded, with one
+conan upload --list per batch; UploadQueue runs the batches in the
+background while other builds go on.
+"""
+
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from build_log import BuildLogs, print_locked
+from build_report import RunReport
+
+
+def remote_has_package(package: dict, remote: str) -> bool | None:
+    """
+    Check whether a package revision (dict with 'ref' including the recipe
+    revision, 'package_id' and 'prev') is already on a remote.
+    Returns None if the remote could not be queried.
+    """
+    ref, _, rrev = (package.get("ref") or "").partition("#")
+    cmd = ["conan", "list", f"{ref}#{rrev}:{package['package_id']}#{package['prev']}",
+           f"-r={remote}", "--format=json"]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            return None
+        data = json.loads(result.stdout)
+    except Exception as e:
+        print(f"Warning: failed to list {ref} on {remote}: {e}", file=sys.stderr)
+        return None
+
+    # Errors, including a missing recipe or package, are reported per remote
+    error = data.get(remote, {}).get("error")
+    if error:
+        if "not found" in error.lower():
+            return False
+        print(f"Warning: failed to list {ref} on {remote}: {error.splitlines()[0]}", file=sys.stderr)
+        return None
+    packages = (data.get(remote, {}).get(ref.split("@")[0], {}).get("revisions", {})
+                .get(rrev, {}).get("packages", {}))
+    return package["prev"] in packages.get(package["package_id"], {}).get("revisions", {})
+
+
+def upload_packages(packages: list[dict], remote: str, list_path: Path,
+                    logs: BuildLogs | None = None) -> bool:
+    """
+    Upload exactly the given package revisions to remote, with a single conan upload --list.
+    Packages without known revisions are uploaded by reference.
+    """
+    logs = logs or BuildLogs()
+    package_list = {}
+    fallback = []
+    for package in packages:
+        ref = package["ref"]
+        if "#" not in ref or not package["package_id"] or not package["prev"]:
+            fallback.append(ref.split("#")[0])
+            continue
+        name_version, rrev = ref.split("#", 1)
+        revisions = package_list.setdefault(name_version, {"revisions": {}})["revisions"]
+        binaries = revisions.setdefault(rrev, {"packages": {}})["packages"]
+        binaries.setdefault(package["package_id"], {"revisions": {}})["revisions"][package["prev"]] = {}
+
+    success = True
+    if package_list:
+        with open(list_path, "w") as f:
+            json.dump({"Local Cache": package_list}, f, indent=2)
+        cmd = ["conan", "upload", f"--list={list_path}", f"-r={remote}", "--confirm"]
+        print_locked(f"Uploading: {', '.join(p['ref'] for p in packages if p['ref'].split('#')[0] not in fallback)}")
+        success = logs.run(cmd, list_path.stem, "upload")["returncode"] == 0
+
+    for ref in dict.fromkeys(fallback):
+        cmd = ["conan", "upload", f"{ref}:*", f"-r={remote}", "--confirm"]
+        print_locked(f"Uploading: {ref}")
+        success = logs.run(cmd, ref, "upload")["returncode"] == 0 and success
+
+    return success
+
+
+class UploadQueue:
+    """
+    Uploads built package revisions in batches, in the background while builds go on.
+    close() uploads what is left and waits for every batch.
+    """
+
+    def __init__(
+        self,
+        remote: str,
+        max_in_flight: int = 2,
+        batch_size: int = 4,
+        report: RunReport | None = None,
+        logs: BuildLogs | None = None,
+    ):
+        self.remote = remote
+        self.report = report
+        self.logs = logs
+        self.batch_size = max(1, batch_size)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conan-upload-"))
+        self.lock = threading.Lock()
+        self.pending = []
+        self.batches = []
+
+    def put(self, package: dict, build_id: str):
+        """Queue a created package for upload."""
+        with self.lock:
+            self.pending.append((package, build_id))
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        list_path = self.work_dir / f"batch-{len(self.batches)}.json"
+        future = self.pool.submit(self._upload, batch, list_path)
+        self.batches.append((future, [build_id for _, build_id in batch]))
+
+    def _upload(self, batch: list[tuple[dict, str]], list_path: Path) -> bool:
+        start = time.monotonic()
+        try:
+            return upload_packages([p for p, _ in batch], self.remote, list_path, self.logs)
+        finally:
+            if self.report:
+                # One conan upload serves the whole batch; every build gets the span
+                end = time.monotonic()
+                for _, build_id in batch:
+                    self.report.record("upload", build_id, start, end, batch=list_path.stem)
+
+    def close(self) -> list[str]:
+        """
+        Upload remaining packages and wait for every batch.
+        Returns build_ids whose upload failed.
+        """
+        with self.lock:
+            self._flush()
+        failed = []
+        for future, build_ids in self.batches:
+            try:
+                ok = future.result()
+            except Exception as e:
+                print_locked(f"Warning: upload failed: {e}", file=sys.stderr)
+                ok = False
+            if not ok:
+                failed.extend(build_ids)
+        self.pool.shutdown()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        return failed
+
@@ -0,0 +1,176 @@
+"""
+Static analysis of conanfile.py recipes.
+
+A recipe is parsed once with ast, without importing it or running Conan,
+and everything the tooling needs is extracted in a single pass:
+class attributes, requirements (requires, tool_requires, test_requires,
+build_requires; as attributes or self.<kind>() calls, including f-strings
+and version ranges) and options.
+Used by scripts/build_packages.py (dependency graph, options) and
+linter/check_recipes.py (attribute checks).
+"""
+
+import ast
+import functools
+from pathlib import Path
+
+# Requirement kinds, as conanfile attributes and self.<kind>() methods
+REQUIREMENT_KINDS = ("requires", "tool_requires", "test_requires", "build_requires")
+
+
+def find_conanfile_class(tree: ast.Module) -> ast.ClassDef | None:
+    """First class inheriting from ConanFile (or conan.ConanFile)."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            for base in node.bases:
+                if isinstance(base, ast.Name) and base.id == "ConanFile":
+                    return node
+                if isinstance(base, ast.Attribute) and base.attr == "ConanFile":
+                    return node
+    return None
+
+
+def parse_reference(node: ast.expr) -> dict | None:
+    """
+    Package name and version of a requirement reference expression.
+    The version is None when it is computed at runtime (f-string parts).
+    Returns None if not even the package name is static.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        ref = node.value
+    elif isinstance(node, ast.JoinedStr):
+        # Static prefix of an f-string, e.g. f"actor-zeta/{self.version}"
+        ref = ""
+        for value in node.values:
+            if not (isinstance(value, ast.Constant) and isinstance(value.value, str)):
+                if "/" not in ref:
+                    return None
+                name, _, version = ref.partition("/")
+                return {"ref": ast.unparse(node), "name": name.strip(), "version": None}
+            ref += value.value
+    else:
+        return None
+
+    name, sep, rest = ref.strip().partition("/")
+    if not sep or not name:
+        return None
+    version = rest.split("@")[0].split("#")[0] or None
+    return {"ref": ref, "name": name, "version": version}
+
+
+def literal(node: ast.expr):
+    """Value of a literal expression, or None if it is not one."""
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+class _RecipeVisitor(ast.NodeVisitor):
+    """Collects the self.<kind>() requirement calls inside recipe methods."""
+
+    def __init__(self, info: dict):
+        self.info = info
+
+    def visit_Call(self, node: ast.Call):
+        func = node.func
+        if (isinstance(func, ast.Attribute) and func.attr in REQUIREMENT_KINDS
+                and isinstance(func.value, ast.Name) and func.value.id == "self" and node.args):
+            self.add_requirement(node.args[0])
+        self.generic_visit(node)
+
+    def add_requirement(self, ref_node: ast.expr):
+        requirement = parse_reference(ref_node)
+        if requirement is None:
+            self.info["dynamic_requirements"] = True
+        else:
+            self.info["requirements"].append(requirement)
+
+
+def analyze_tree(tree: ast.Module) -> dict:
+    """
+    Extract recipe information from a parsed conanfile.py.
+    Returns dict with keys:
+      class_name: name of the ConanFile class, or None if there is none
+      attributes: class attribute name -> line
+      requirements: list of {'ref', 'name', 'version'} of every kind,
+                    conditional or not
+      dynamic_requirements: True if some requirement could not be resolved
+      options: literal value, or None if computed
+    """
+    info = {
+        "class_name": None,
+        "attributes": {},
+        "requirements": [],
+        "dynamic_requirements": False,
+        "options": {},
+    }
+
+    conan_class = find_conanfile_class(tree)
+    if conan_class is None:
+        return info
+    info["class_name"] = conan_class.name
+    visitor = _RecipeVisitor(info)
+
+    for node in conan_class.body:
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets, value = [node.target], node.value
+        else:
+            visitor.visit(node)
+            continue
+
+        for target in targets:
+            if not isinstance(target, ast.Name):
+                continue
+            info["attributes"][target.id] = node.lineno
+
+            if target.id in REQUIREMENT_KINDS:
+                refs = value.elts if isinstance(value, (ast.Tuple, ast.List)) else [value]
+                for ref_node in refs:
+                    visitor.add_requirement(ref_node)
+            elif target.id == "options":
+                info["options"] = literal(value)
+
+    return info
+
+
+@functools.lru_cache(maxsize=None)
+def parse_recipe(path: Path) -> ast.Module:
+    """
+    Parse a conanfile.py, once per file and process.
+    Raises OSError or SyntaxError. The result must not be modified.
+    """
+    with open(path, "rb") as f:
+        return ast.parse(f.read(), filename=str(path))
+
+
+@functools.lru_cache(maxsize=None)
+def analyze_recipe(path: Path) -> dict:
+    """
+    Analyze a conanfile.py (see analyze_tree), once per file and process.
+    Raises OSError or SyntaxError. The result must not be modified.
+    """
+    return analyze_tree(parse_recipe(path))
+
+
+def required_packages(info: dict) -> set[str]:
+    """Names of all packages a recipe may require, of any kind."""
+    return {requirement["name"] for requirement in info["requirements"]}
+
+
+def options_definitions(info: dict) -> dict[str, list[str]] | None:
+    """
+    Options of a recipe in the form of conan inspect's options_definitions
+    (values as strings). None if the options are not literal.
+    """
+    options = info["options"]
+    if not isinstance(options, dict):
+        return None
+    definitions = {}
+    for name, values in options.items():
+        if not isinstance(values, (list, tuple)):
+            return None
+        definitions[str(name)] = [str(value) for value in values]
+    return definitions
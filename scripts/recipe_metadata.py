@@ -0,0 +1,254 @@
+"""
+Options and dependencies of recipes, for scripts/build_packages.py.
+
+They are read from conanfile.py by the static analysis of recipe_analyzer;
+conan inspect only runs for recipes whose options are computed. Results,
+and the revisions each recipe folder was exported as, are cached on disk
+(RecipeMetadataCache), keyed by the content of the recipe.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from build_report import RunReport
+from build_scheduler import available_cpus
+from recipe_analyzer import analyze_recipe, options_definitions, required_packages
+from workspace import JsonCache
+
+
+class RecipeMetadataCache(JsonCache):
+    """
+    On-disk cache of recipe metadata (options, required packages), keyed by recipe content,
+    and of the recipe revisions each recipe folder was exported as.
+    """
+
+    FILENAME = "recipe-metadata.json"
+    SECTIONS = ("entries", "exports")
+
+    # Bump when the way metadata is extracted changes
+    VERSION = 2
+
+    def __init__(self, cache_dir: Path, conan_version: str):
+        super().__init__(cache_dir)
+        self.conan_version = conan_version
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, recipe_path: Path) -> str:
+        """Content hash identifying the current state of a recipe folder."""
+        h = hashlib.sha256(f"{self.VERSION}\0{self.conan_version}".encode())
+        for name in ("conanfile.py", "conandata.yml"):
+            h.update(f"\0{name}\0".encode())
+            try:
+                h.update((recipe_path / name).read_bytes())
+            except FileNotFoundError:
+                pass
+        return h.hexdigest()
+
+    def export_key(self, recipe_path: Path) -> str:
+        """
+        Content hash of the files a recipe folder is exported from:
+        everything but test_package, hidden files and local build output.
+        """
+        h = hashlib.sha256(self.conan_version.encode())
+        for root, dirs, files in os.walk(recipe_path):
+            rel_root = Path(root).relative_to(recipe_path)
+            dirs[:] = sorted(
+                d for d in dirs
+                if not d.startswith(".") and d != "build"
+                and not (rel_root == Path(".") and d == "test_package")
+            )
+            for name in sorted(files):
+                if name.startswith(".") or name == "CMakeUserPresets.json":
+                    continue
+                h.update(f"\0{(rel_root / name).as_posix()}\0".encode())
+                h.update((Path(root) / name).read_bytes())
+        return h.hexdigest()
+
+    def get(self, recipe_path: Path) -> dict | None:
+        """Return cached metadata for recipe_path, or None."""
+        entry = self.entries.get(self.key(recipe_path))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["used"] = time.time()
+        return entry
+
+    def put(self, recipe_path: Path, options: dict, requires: set[str]):
+        """Store metadata for recipe_path, replacing older states of it."""
+        path = str(recipe_path.resolve())
+        self.entries = {
+            key: entry for key, entry in self.entries.items()
+            if entry.get("path") != path
+        }
+        self.entries[self.key(recipe_path)] = {
+            "path": path,
+            "used": time.time(),
+            "options": options,
+            "requires": sorted(requires),
+        }
+
+    def get_exports(self, recipe_path: Path) -> dict[str, str]:
+        """
+        Recipe revisions the current state of recipe_path was exported as.
+        Returns dict: version -> recipe revision
+        """
+        entry = self.exports.get(self.export_key(recipe_path))
+        if entry is None:
+            return {}
+        entry["used"] = time.time()
+        return entry["revisions"]
+
+    def put_export(self, recipe_path: Path, version: str, revision: str):
+        """Record that recipe_path was exported as version#revision."""
+        key = self.export_key(recipe_path)
+        path = str(recipe_path.resolve())
+        if key not in self.exports:
+            self.exports = {
+                k: entry for k, entry in self.exports.items()
+                if entry.get("path") != path
+            }
+            self.exports[key] = {"path": path, "revisions": {}}
+        self.exports[key]["used"] = time.time()
+        self.exports[key]["revisions"][version] = revision
+
+
+def get_recipe_options(recipe_path: Path) -> dict | None:
+    """
+    Get available options from recipe via conan inspect.
+    Returns None if the recipe could not be inspected.
+    """
+    cmd = ["conan", "inspect", str(recipe_path), "--format=json"]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode == 0:
+            data = json.loads(result.stdout)
+            return data.get("options_definitions", {})
+    except Exception as e:
+        print(f"Warning: failed to inspect recipe: {e}", file=sys.stderr)
+
+    return None
+
+
+def inspect_recipes(
+    recipe_paths: list[Path],
+    report: RunReport | None = None,
+) -> dict[Path, dict | None]:
+    """
+    Get options of several recipes, running conan inspect concurrently.
+    Returns dict: recipe_path -> options_definitions (None if inspect failed)
+    """
+    def inspect(recipe_path: Path) -> dict | None:
+        if report is None:
+            return get_recipe_options(recipe_path)
+        with report.span("inspect", str(recipe_path), cached=False):
+            return get_recipe_options(recipe_path)
+
+    if len(recipe_paths) <= 1:
+        return {path: inspect(path) for path in recipe_paths}
+
+    # conan inspect is dominated by interpreter startup, not CPU, so run
+    # more processes than there are cores
+    workers = min(len(recipe_paths), max(4, available_cpus()))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(recipe_paths, pool.map(inspect, recipe_paths)))
+
+
+def get_required_packages(recipe_path: Path) -> set[str]:
+    """
+    Extract names of all packages required by conanfile.py: requires,
+    tool_requires and test_requires, conditional or not.
+    """
+    conanfile = recipe_path / "conanfile.py"
+    if not conanfile.exists():
+        return set()
+
+    try:
+        return required_packages(analyze_recipe(conanfile))
+    except (OSError, SyntaxError) as e:
+        print(f"Warning: failed to parse dependencies: {e}", file=sys.stderr)
+        return set()
+
+
+def get_static_options(recipe_path: Path) -> dict | None:
+    """
+    Get options of a recipe from its source, without running Conan.
+    Returns None if they are computed rather than literal.
+    """
+    try:
+        return options_definitions(analyze_recipe(recipe_path / "conanfile.py"))
+    except (OSError, SyntaxError):
+        return None
+
+
+def get_local_requires(recipe_path: Path, local_packages: set[str]) -> set[str] | None:
+    """
+    References (name/version) of the local packages a recipe requires, read
+    from its source. None if one of them has no fixed version (computed, or
+    a version range).
+    """
+    try:
+        info = analyze_recipe(recipe_path / "conanfile.py")
+    except (OSError, SyntaxError):
+        return None
+    if info["dynamic_requirements"]:
+        return None
+
+    refs = set()
+    for requirement in info["requirements"]:
+        if requirement["name"] not in local_packages:
+            continue
+        version = requirement["version"]
+        if version is None or version.startswith("["):
+            return None
+        refs.add(f"{requirement['name']}/{version}")
+    return refs
+
+
+def load_recipe_metadata(
+    recipe_paths: list[Path],
+    cache: RecipeMetadataCache | None = None,
+    report: RunReport | None = None,
+) -> dict[Path, dict]:
+    """
+    Get options and required packages of several recipes, from cache or their source;
+    only recipes with computed options are inspected with Conan.
+    Returns dict: recipe_path -> {'options': ..., 'requires': set[str]}
+    """
+    metadata = {}
+    missing = []
+    for recipe_path in recipe_paths:
+        entry = cache.get(recipe_path) if cache else None
+        if entry is not None:
+            metadata[recipe_path] = {
+                "options": entry["options"],
+                "requires": set(entry["requires"]),
+            }
+            continue
+
+        options = get_static_options(recipe_path)
+        if options is None:
+            missing.append(recipe_path)
+            continue
+        requires = get_required_packages(recipe_path)
+        metadata[recipe_path] = {"options": options, "requires": requires}
+        if cache:
+            cache.put(recipe_path, options, requires)
+
+    for recipe_path, options in inspect_recipes(missing, report).items():
+        requires = get_required_packages(recipe_path)
+        metadata[recipe_path] = {"options": options or {}, "requires": requires}
+        # Failed inspections are retried next run rather than cached
+        if cache and options is not None:
+            cache.put(recipe_path, options, requires)
+
+    return metadata
+
@@ -0,0 +1,132 @@
+"""
+Content-addressed cache of recipe source archives.
+
+Archives are stored as <dir>/s/<sha256>, the layout of Conan's
+core.sources:download_cache, so a directory filled here can be passed to
+Conan as is (-cc core.sources:download_cache=<dir>) and get() calls with a
+sha256 are served from it. Used by linter/check_recipes.py --verify-sources
+and by scripts/build_packages.py to fetch every source once per run.
+"""
+
+import hashlib
+import http.client
+import os
+import tempfile
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from workspace import DEFAULT_CACHE_DIR
+
+# Default cache location, shared by the linter and the build script
+DEFAULT_SOURCE_CACHE = DEFAULT_CACHE_DIR / "sources"
+
+# Download settings
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+USER_AGENT = "conan-duckstax"
+
+
+def cached_source_path(cache_dir: Path, sha256: str) -> Path:
+    """Location of a source archive in the content-addressed cache."""
+    return cache_dir / "s" / sha256.lower()
+
+
+def download_source(urls: list[str], sha256: str, cache_dir: Path) -> tuple[str, Optional[str]]:
+    """
+    Fetch a source archive into the cache unless it is already there.
+    The archive is hashed while it is streamed to disk and only moved into
+    the cache if the sha256 matches. urls are mirrors, tried in order.
+    Returns (status, error) where status is 'cached', 'downloaded' or 'failed'.
+    """
+    target = cached_source_path(cache_dir, sha256)
+    if target.exists():
+        return "cached", None
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    error = None
+    for url in urls:
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".part")
+        digest = hashlib.sha256()
+        try:
+            request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+            with os.fdopen(fd, "wb") as f, urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+                while chunk := response.read(DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                # read(size) ends quietly when the connection closes early;
+                # length is what the Content-Length still promised
+                missing = response.length
+
+            if missing:
+                error = f"Cannot download {url}: connection closed {missing} bytes before the end"
+                continue
+            if digest.hexdigest() != sha256.lower():
+                error = f"sha256 mismatch for {url}: expected {sha256}, got {digest.hexdigest()}"
+                continue
+
+            os.chmod(tmp_name, 0o644)
+            os.replace(tmp_name, target)
+            return "downloaded", None
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            # HTTPException: e.g. IncompleteRead of a truncated response
+            error = f"Cannot download {url}: {e}"
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    return "failed", error
+
+
+def collect_sources(conandata_path: Path) -> list[tuple[str, list[str], str]]:
+    """
+    Get the sources listed in conandata.yml.
+    Returns list of (version, urls, sha256); malformed entries are left to
+    validate_conandata_yml.
+    """
+    try:
+        with open(conandata_path) as f:
+            conandata = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError):
+        return []
+
+    sources = (conandata or {}).get("sources")
+    if not isinstance(sources, dict):
+        return []
+
+    result = []
+    for version, source in sources.items():
+        if not isinstance(source, dict) or "url" not in source:
+            continue
+        sha256 = source.get("sha256")
+        if not isinstance(sha256, str) or len(sha256) != 64:
+            continue
+        urls = source["url"] if isinstance(source["url"], list) else [source["url"]]
+        result.append((str(version), [str(url) for url in urls], sha256))
+    return result
+
+
+def prefetch_sources(
+    sources: list[tuple[list[str], str]],
+    cache_dir: Path,
+    jobs: int = 4,
+) -> dict[str, tuple[str, Optional[str]]]:
+    """
+    Fetch several source archives into the cache concurrently, each sha256 once.
+    sources is a list of (urls, sha256).
+    Returns dict: sha256 -> (status, error) as returned by download_source()
+    """
+    unique = {}
+    for urls, sha256 in sources:
+        unique.setdefault(sha256.lower(), urls)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(unique) or 1))) as pool:
+        futures = {
+            sha256: pool.submit(download_source, urls, sha256, cache_dir)
+            for sha256, urls in unique.items()
+        }
+        return {sha256: future.result() for sha256, future in futures.items()}
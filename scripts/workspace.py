@@ -0,0 +1,80 @@
+"""
+State shared by scripts/build_packages.py and linter/check_recipes.py: the
+persistent cache directory with its JSON cache files, and the files changed
+in the git checkout since a ref.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Persistent cache location (recipe metadata, lint results, sources, ...)
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "conan-duckstax"
+
+# Cache entries not used for this long are evicted
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+
+class JsonCache:
+    """
+    A JSON file in the cache directory holding SECTIONS, each a dict of
+    entries with a 'used' timestamp, available as attributes of the same
+    name. Entries not used for CACHE_MAX_AGE are evicted on save.
+    """
+
+    FILENAME = "cache.json"
+    SECTIONS = ("entries",)
+
+    def __init__(self, cache_dir: Path):
+        self.path = cache_dir / self.FILENAME
+        data = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable cache {self.path}: {e}", file=sys.stderr)
+        for section in self.SECTIONS:
+            setattr(self, section, data.get(section, {}) if isinstance(data, dict) else {})
+
+    def save(self):
+        """Write the cache to disk, evicting stale entries."""
+        cutoff = time.time() - CACHE_MAX_AGE
+        data = {
+            section: {
+                key: entry for key, entry in getattr(self, section).items()
+                if entry.get("used", 0) >= cutoff
+            }
+            for section in self.SECTIONS
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: failed to write cache {self.path}: {e}", file=sys.stderr)
+
+
+def git_changed_files(since: str, cwd: Path) -> tuple[Path, str, list[str]]:
+    """
+    List files changed between the merge base of since and HEAD, and the
+    working tree.
+    Returns (repository root, base commit, paths relative to the root).
+    Raises subprocess.CalledProcessError if git fails.
+    """
+    def git(*git_args: str) -> str:
+        result = subprocess.run(
+            ["git", *git_args], cwd=cwd, capture_output=True, text=True, check=True,
+        )
+        return result.stdout.strip()
+
+    root = Path(git("rev-parse", "--show-toplevel"))
+    base = git("merge-base", since, "HEAD")
+    files = git("diff", "--name-only", base, "--").splitlines()
+    return root, base, files
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The build tooling and the linter are sets of scripts, not packages
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+sys.path.insert(0, str(ROOT / "linter"))
@@ -0,0 +1,28 @@
+import shutil
+
+from build_history import BuildHistory
+
+
+def build(package: str, status: str = "succeeded", duration: float = 60.0) -> dict:
+    return {"package": package, "version": "1.0", "profile": "cpp20", "build_type": "Release",
+            "status": status, "duration": duration, "peak_rss": 1 << 30, "jobs": 4}
+
+
+def test_merge_adds_each_shard_build_once(tmp_path):
+    base = BuildHistory(tmp_path / "base.sqlite")
+    base.record([build("actor-zeta")])
+    base.close()
+
+    # Every shard starts from the merged history and appends its own builds
+    for shard, package in (("1", "otterbrix"), ("2", "other")):
+        shutil.copy(tmp_path / "base.sqlite", tmp_path / f"shard{shard}.sqlite")
+        history = BuildHistory(tmp_path / f"shard{shard}.sqlite")
+        history.record([build(package, duration=120.0)])
+        history.close()
+
+    merged = BuildHistory(tmp_path / "base.sqlite")
+    assert merged.merge(tmp_path / "shard1.sqlite") == 1
+    assert merged.merge(tmp_path / "shard2.sqlite") == 1
+    assert merged.merge(tmp_path / "shard1.sqlite") == 0
+    assert [c[0] for c in merged.configurations()] == ["actor-zeta", "other", "otterbrix"]
+    assert merged.estimate("otterbrix", "1.0", "cpp20", "Release") == 120.0
@@ -0,0 +1,47 @@
+import subprocess
+
+import check_recipes
+
+
+def git(repo, *args: str):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   cwd=repo, check=True, capture_output=True)
+
+
+def repository(tmp_path, monkeypatch):
+    """A git repository with two recipes and the linter sources."""
+    repo = tmp_path / "repo"
+    for folder in ("recipes/a/all", "recipes/b/all", "linter/schemas", "scripts"):
+        (repo / folder).mkdir(parents=True)
+    for package in ("a", "b"):
+        (repo / "recipes" / package / "config.yml").write_text("versions: {}\n")
+        (repo / "recipes" / package / "all" / "conanfile.py").write_text("")
+    (repo / "linter" / "check_recipes.py").write_text("")
+    (repo / "linter" / "schemas" / "config.schema.yml").write_text("")
+    (repo / "scripts" / "recipe_analyzer.py").write_text("")
+    git(repo, "init", "-q")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "initial")
+
+    monkeypatch.setattr(check_recipes, "LINTER_DIR", repo / "linter")
+    monkeypatch.setattr(check_recipes, "SCHEMAS_DIR", repo / "linter" / "schemas")
+    monkeypatch.setattr(check_recipes, "SCRIPTS_DIR", repo / "scripts")
+    return repo
+
+
+def test_changed_recipe_folders(tmp_path, monkeypatch):
+    repo = repository(tmp_path, monkeypatch)
+    (repo / "recipes" / "a" / "all" / "conanfile.py").write_text("# changed\n")
+    recipes = repo / "recipes"
+    assert check_recipes.changed_recipe_dirs("HEAD", recipes) == {recipes / "a" / "all"}
+
+    (repo / "recipes" / "b" / "config.yml").write_text("versions: {'1.0': {folder: all}}\n")
+    assert check_recipes.changed_recipe_dirs("HEAD", recipes) == {recipes / "a" / "all", recipes / "b"}
+
+
+def test_linter_change_validates_every_recipe(tmp_path, monkeypatch):
+    for changed in ("linter/check_recipes.py", "linter/schemas/config.schema.yml",
+                    "scripts/recipe_analyzer.py"):
+        repo = repository(tmp_path / changed.replace("/", "_"), monkeypatch)
+        (repo / changed).write_text("# changed\n")
+        assert check_recipes.changed_recipe_dirs("HEAD", repo / "recipes") is None
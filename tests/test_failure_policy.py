@@ -0,0 +1,66 @@
+import argparse
+import os
+import stat
+
+import build_packages
+from build_log import BuildLogs, run_logged
+from build_report import RunReport
+from build_scheduler import FailurePolicy
+
+RETRIED_WARNING = ("WARN: Error downloading file https://example.com/src.tar.gz: "
+                   "'HTTPSConnectionPool(host='example.com', port=443): Read timed out.'")
+
+
+def sh(script: str) -> dict:
+    return run_logged(["sh", "-c", script], "test", output="quiet")
+
+
+def test_warning_followed_by_hard_error_is_not_transient():
+    result = sh(f"echo \"{RETRIED_WARNING}\"; echo 'ERROR: compile failed'; exit 1")
+    assert result["transient"] is None
+
+
+def test_network_error_is_transient():
+    result = sh("echo 'ERROR: pkg/1.0: Error in source() method, line 97'; "
+                "echo \"  ConanException: Error downloading file x: 'Connection reset by peer'\"; exit 1")
+    assert "Connection reset" in result["transient"]
+
+
+def test_not_found_is_not_transient():
+    result = sh("echo 'ERROR: Error downloading file x: Not found: https://example.com/x'; exit 1")
+    assert result["transient"] is None
+
+
+def test_success_is_never_transient():
+    assert sh("echo 'ERROR: Error downloading file x: Read timed out'")["transient"] is None
+
+
+def run_with_fake_conan(tmp_path, monkeypatch, error: str) -> tuple[str, int, int]:
+    """run_build() against a conan that prints RETRIED_WARNING, then error, and fails."""
+    calls = tmp_path / "calls"
+    conan = tmp_path / "conan"
+    conan.write_text(f"#!/bin/sh\necho x >> {calls}\necho \"{RETRIED_WARNING}\" >&2\n"
+                     f"echo \"{error}\" >&2\nexit 1\n")
+    conan.chmod(conan.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+    cell = {
+        "package": "pkg", "version": "1.0", "recipe_path": tmp_path, "cxx_std": None,
+        "profile": {"path": None, "name": "default"}, "build_id": "pkg/1.0 [default]",
+    }
+    args = argparse.Namespace(
+        policy=FailurePolicy({}, retries=2, retry_delay=0.0),
+        report=RunReport(), build_type="Release", source_cache=None,
+        compiler_launcher=None, build_option=[], logs=BuildLogs(output="quiet"), upload_queue=None,
+    )
+    status = build_packages.run_build(cell, args, None)
+    return status, len(calls.read_text().splitlines()), args.report.counters["retries"]
+
+
+def test_no_retry_after_hard_error(tmp_path, monkeypatch):
+    assert run_with_fake_conan(tmp_path, monkeypatch, "ERROR: compile failed") == ("failed", 1, 0)
+
+
+def test_retry_after_network_error(tmp_path, monkeypatch):
+    error = "ERROR: Error downloading file x: Temporary failure in name resolution"
+    assert run_with_fake_conan(tmp_path, monkeypatch, error) == ("failed", 3, 2)
@@ -0,0 +1,47 @@
+import ast
+
+from recipe_analyzer import analyze_tree, options_definitions, required_packages
+
+RECIPE = '''
+from conan import ConanFile
+
+
+class Example(ConanFile):
+    name = "example"
+    requires = "zlib/1.3"
+    options = {"shared": [True, False], "cxx_standard": [17, 20]}
+
+    def requirements(self):
+        self.requires(f"actor-zeta/{self.version}")
+        if self.options.shared:
+            self.requires("fmt/[>=10]")
+
+    def build_requirements(self):
+        self.tool_requires("cmake/3.27.0")
+'''
+
+
+def test_requirements_of_every_kind():
+    info = analyze_tree(ast.parse(RECIPE))
+    assert info["class_name"] == "Example"
+    assert required_packages(info) == {"zlib", "actor-zeta", "fmt", "cmake"}
+    versions = {r["name"]: r["version"] for r in info["requirements"]}
+    assert versions == {"zlib": "1.3", "actor-zeta": None, "fmt": "[>=10]", "cmake": "3.27.0"}
+    assert not info["dynamic_requirements"]
+
+
+def test_literal_options_as_strings():
+    info = analyze_tree(ast.parse(RECIPE))
+    assert options_definitions(info) == {"shared": ["True", "False"], "cxx_standard": ["17", "20"]}
+
+
+def test_computed_requirements_and_options():
+    info = analyze_tree(ast.parse(
+        "from conan import ConanFile\n"
+        "class A(ConanFile):\n"
+        "    options = dict(shared=[True, False])\n"
+        "    def requirements(self):\n"
+        "        self.requires(self.dependency_ref())\n"
+    ))
+    assert info["dynamic_requirements"]
+    assert options_definitions(info) is None
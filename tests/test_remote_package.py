@@ -0,0 +1,36 @@
+import json
+import subprocess
+
+import package_upload
+
+PACKAGE = {"ref": "otterbrix/1.0#abc", "package_id": "123", "prev": "def"}
+
+
+def conan_list(monkeypatch, returncode: int, data: dict):
+    def run(cmd, **kwargs):
+        return subprocess.CompletedProcess(cmd, returncode, json.dumps(data), "")
+    monkeypatch.setattr(package_upload.subprocess, "run", run)
+
+
+def test_package_on_remote(monkeypatch):
+    conan_list(monkeypatch, 0, {"otterbrix": {"otterbrix/1.0": {"revisions": {"abc": {
+        "packages": {"123": {"revisions": {"def": {}}}}}}}}})
+    assert package_upload.remote_has_package(PACKAGE, "otterbrix") is True
+
+
+def test_other_package_revision_on_remote(monkeypatch):
+    conan_list(monkeypatch, 0, {"otterbrix": {"otterbrix/1.0": {"revisions": {"abc": {
+        "packages": {"123": {"revisions": {"old": {}}}}}}}}})
+    assert package_upload.remote_has_package(PACKAGE, "otterbrix") is False
+
+
+def test_recipe_missing_on_remote(monkeypatch):
+    conan_list(monkeypatch, 0, {"otterbrix": {"error": "Recipe 'otterbrix/1.0' not found"}})
+    assert package_upload.remote_has_package(PACKAGE, "otterbrix") is False
+
+
+def test_remote_unreachable(monkeypatch):
+    conan_list(monkeypatch, 0, {"otterbrix": {"error": "Unable to connect to remote otterbrix"}})
+    assert package_upload.remote_has_package(PACKAGE, "otterbrix") is None
+    conan_list(monkeypatch, 1, {})
+    assert package_upload.remote_has_package(PACKAGE, "otterbrix") is None
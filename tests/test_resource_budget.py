@@ -0,0 +1,53 @@
+import pytest
+
+from build_packages import get_build_resources
+from build_scheduler import BuildScheduler, ResourceBudget
+
+GIB = 1024 * 1024 * 1024
+
+
+def cell(package: str, version: str) -> dict:
+    return {"package": package, "version": version, "profile": {"name": "default"},
+            "build_id": f"{package}/{version}"}
+
+
+def test_remaining_build_gets_all_free_cores():
+    budget = ResourceBudget(8, None, 4, {})
+    first, second = cell("a", "1"), cell("a", "2")
+    assert budget.acquire(first, waiting=2) == 4
+    assert budget.acquire(second, waiting=1) == 4
+    budget.release(first, 4)
+    budget.release(second, 4)
+    assert budget.acquire(cell("b", "1"), waiting=1) == 8
+
+
+def test_share_is_capped_by_memory():
+    needs = {"b": {"memory_per_job": 2 * GIB, "base_memory": GIB, "max_jobs": None}}
+    budget = ResourceBudget(8, 7 * GIB, 4, needs)
+    assert budget.acquire(cell("b", "1")) == 3
+
+
+def test_scheduler_gives_the_tail_build_every_core():
+    cells = [cell("a", str(v)) for v in range(4)] + [cell("b", "1")]
+    scheduler = BuildScheduler(cells, {"a": set(), "b": {"a"}}, 4, ResourceBudget(8, None, 4, {}))
+    jobs = {}
+    scheduler.run(lambda c, j: jobs.setdefault(c["build_id"], j) and "succeeded")
+    assert [jobs[f"a/{v}"] for v in range(4)] == [2, 2, 2, 2]
+    assert jobs["b/1"] == 8
+
+
+@pytest.mark.parametrize("section", [
+    "build_resources:\n  memory_per_job_mb:\n  max_jobs: '4'\n",
+    "build_resources:\n",
+    "build_resources: [1, 2]\n",
+])
+def test_malformed_build_resources_are_ignored(tmp_path, section):
+    config = tmp_path / "config.yml"
+    config.write_text("versions:\n  '1.0':\n    folder: all\n" + section)
+    assert get_build_resources(config) == {"memory_per_job": None, "base_memory": None, "max_jobs": None}
+
+
+def test_build_resources_in_bytes(tmp_path):
+    config = tmp_path / "config.yml"
+    config.write_text("build_resources:\n  memory_per_job_mb: 2\n  base_memory_mb: 0\n  max_jobs: 4\n")
+    assert get_build_resources(config) == {"memory_per_job": 2 << 20, "base_memory": 0, "max_jobs": 4}
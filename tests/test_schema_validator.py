@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from schema_validator import SchemaError, compile_schema
+
+SCHEMAS_DIR = Path(__file__).resolve().parent.parent / "linter" / "schemas"
+
+
+def validate(tmp_path, schema: str, document: str) -> list[tuple[str, int]]:
+    path = tmp_path / "schema.yml"
+    path.write_text(schema)
+    return compile_schema(path)(yaml.compose(document))
+
+
+def messages(errors) -> list[str]:
+    return [message for message, _ in errors]
+
+
+def test_scalar_types_come_from_yaml_tags(tmp_path):
+    schema = "name: str()\ncount: int()\nratio: num()\nflag: bool()\n"
+    assert validate(tmp_path, schema, "name: '1.0'\ncount: 3\nratio: 1\nflag: true\n") == []
+    assert messages(validate(tmp_path, schema, "name: 1.0\ncount: '3'\nratio: x\nflag: yes_\n")) == [
+        "name: '1.0' is not a str",
+        "count: '3' is not a int",
+        "ratio: 'x' is not a num",
+        "flag: 'yes_' is not a bool",
+    ]
+
+
+def test_errors_carry_their_line(tmp_path):
+    errors = validate(tmp_path, "a: int()\nb: int(min=2)\n", "a: 1\n\nb: 1\n")
+    assert errors == [("b: '1' is less than 2", 3)]
+
+
+def test_required_and_optional_fields(tmp_path):
+    schema = "a: str()\nb: str(required=False)\n"
+    assert validate(tmp_path, schema, "a: x\n") == []
+    assert validate(tmp_path, schema, "a: x\nb:\n") == []
+    assert messages(validate(tmp_path, schema, "b: x\n")) == ["a: required field missing"]
+
+
+def test_mappings_are_strict_unless_included_with_strict_false(tmp_path):
+    schema = ("strict: include('entry')\nloose: include('entry', strict=False)\n"
+              "---\nentry:\n  url: str()\n")
+    errors = validate(tmp_path, schema, "strict: {url: a, extra: 1}\nloose: {url: a, extra: 1}\n")
+    assert messages(errors) == ["strict.extra: unexpected element"]
+
+
+def test_containers_enum_and_regex(tmp_path):
+    schema = ("items: list(int(), min=1)\nby_name: map(str(), key=regex('^[a-z]+$'))\n"
+              "mode: enum('a', 'b')\n")
+    assert validate(tmp_path, schema, "items: [1]\nby_name: {x: y}\nmode: a\n") == []
+    assert messages(validate(tmp_path, schema, "items: []\nby_name: {X: 1}\nmode: c\n")) == [
+        "items: fewer than 1 items",
+        "by_name.X (key): 'X' does not match the required pattern",
+        "by_name.X: '1' is not a str",
+        "mode: 'c' not in ['a', 'b']",
+    ]
+
+
+def test_any_and_duplicate_keys(tmp_path):
+    schema = "url: any(str(), list(str()))\n"
+    assert validate(tmp_path, schema, "url: [a, b]\n") == []
+    assert messages(validate(tmp_path, schema, "url: 1\nurl: a\n")) == ["url: duplicate key"]
+    assert messages(validate(tmp_path, schema, "url: {a: b}\n")) == [
+        "url: a map does not match any allowed type",
+    ]
+
+
+def test_recursive_include_terminates(tmp_path):
+    schema = "tree: include('node')\n---\nnode:\n  children: list(include('node'), required=False)\n"
+    assert validate(tmp_path, schema, "tree: {children: [{children: [{}]}]}\n") == []
+    assert messages(validate(tmp_path, schema, "tree: {children: [{leaf: 1}]}\n")) == [
+        "tree.children[0].leaf: unexpected element",
+    ]
+
+
+@pytest.mark.parametrize("schema", ["a: nope()\n", "a: include('missing')\n", "a: str(min=x)\n"])
+def test_malformed_schema(tmp_path, schema):
+    with pytest.raises(SchemaError):
+        validate(tmp_path, schema, "a: 1\n")
+
+
+def test_conandata_accepts_get_arguments_and_mirrors():
+    document = yaml.compose(
+        "sources:\n"
+        "  '2.0':\n"
+        "    url: [https://a.example/x.tar.gz, https://b.example/x.tar.gz]\n"
+        f"    sha256: {'ab' * 32}\n"
+        "    strip_root: true\n"
+        "patches:\n"
+        "  '2.0':\n"
+        "    - patch_file: patches/fix.patch\n"
+        "      base_path: src\n"
+    )
+    assert compile_schema(SCHEMAS_DIR / "conandata.schema.yml")(document) == []
+
+
+def test_optional_null_rejected_with_none_false(tmp_path):
+    schema = "a: int(required=False)\nb: int(required=False, none=False)\n"
+    assert validate(tmp_path, schema, "a:\n") == []
+    assert messages(validate(tmp_path, schema, "b:\n")) == ["b: null is not a int"]
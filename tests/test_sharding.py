@@ -0,0 +1,66 @@
+import argparse
+
+import pytest
+
+from build_packages import parse_shard
+from build_scheduler import build_matrix, shard_cells
+
+# otterbrix requires actor-zeta; "solo" depends on nothing
+PACKAGE_DEPS = {"actor-zeta": set(), "otterbrix": {"actor-zeta"}, "solo": set()}
+
+
+def cell(package: str, version: str, profile: str, estimate: float, requires=None) -> dict:
+    return {"package": package, "version": version, "profile": {"name": profile},
+            "build_id": f"{package}/{version} [{profile}]", "estimate": estimate,
+            "requires": requires, "cxx_std": None, "recipe_path": f"recipes/{package}/all"}
+
+
+def matrix() -> list[dict]:
+    cells = []
+    for profile in ("cpp17", "cpp20"):
+        cells.append(cell("actor-zeta", "1.0", profile, 100))
+        cells.append(cell("actor-zeta", "2.0", profile, 100))
+        cells.append(cell("otterbrix", "1.0", profile, 600, requires={"actor-zeta/2.0"}))
+        cells.append(cell("solo", "1.0", profile, 300))
+    return cells
+
+
+def ids(shards: list[list[dict]]) -> list[list[str]]:
+    return [[c["build_id"] for c in shard] for shard in shards]
+
+
+def test_every_cell_in_exactly_one_shard():
+    cells = matrix()
+    shards = shard_cells(cells, PACKAGE_DEPS, 3)
+    assert sorted(sum(ids(shards), [])) == sorted(c["build_id"] for c in cells)
+
+
+def test_dependencies_share_a_shard():
+    shards = ids(shard_cells(matrix(), PACKAGE_DEPS, 4))
+    for profile in ("cpp17", "cpp20"):
+        together = [s for s in shards if f"otterbrix/1.0 [{profile}]" in s]
+        assert f"actor-zeta/2.0 [{profile}]" in together[0]
+    # The version otterbrix does not require is free to go elsewhere
+    assert sum(1 for shard in shards if shard) == 4
+
+
+def test_partition_is_deterministic_and_balanced():
+    cells = matrix()
+    first = ids(shard_cells(cells, PACKAGE_DEPS, 2))
+    # Every runner plans the same cells and gets the same partition
+    assert ids(shard_cells(matrix(), PACKAGE_DEPS, 2)) == first
+    loads = [sum(c["estimate"] for c in shard) for shard in shard_cells(cells, PACKAGE_DEPS, 2)]
+    assert loads == [1100, 1100]
+
+
+def test_more_shards_than_groups_leaves_some_empty():
+    cells = matrix()
+    shards = shard_cells(cells, PACKAGE_DEPS, 10)
+    assert sum(1 for shard in shards if shard) == build_matrix(cells, PACKAGE_DEPS)["components"]
+
+
+@pytest.mark.parametrize("value", ["0/3", "4/3", "x"])
+def test_parse_shard(value):
+    assert parse_shard("2/3") == (2, 3)
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_shard(value)
@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from source_cache import cached_source_path, download_source, prefetch_sources
+
+ARCHIVE = b"source archive " * 1000
+SHA256 = hashlib.sha256(ARCHIVE).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+    """/ok serves ARCHIVE, /truncated stops halfway through it, anything else is a 404."""
+
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append(self.path)
+        if self.path not in ("/ok", "/truncated"):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(ARCHIVE)))
+        self.end_headers()
+        self.wfile.write(ARCHIVE if self.path == "/ok" else ARCHIVE[:len(ARCHIVE) // 2])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_into_the_cache_once(server, tmp_path):
+    assert download_source([f"{server}/ok"], SHA256, tmp_path) == ("downloaded", None)
+    assert cached_source_path(tmp_path, SHA256).read_bytes() == ARCHIVE
+    assert download_source([f"{server}/ok"], SHA256, tmp_path) == ("cached", None)
+    assert Handler.requests == ["/ok"]
+
+
+def test_hash_mismatch_is_not_cached(server, tmp_path):
+    status, error = download_source([f"{server}/ok"], "0" * 64, tmp_path)
+    assert status == "failed" and "sha256 mismatch" in error
+    assert list((tmp_path / "s").iterdir()) == []
+
+
+def test_truncated_body_is_not_cached(server, tmp_path):
+    status, error = download_source([f"{server}/truncated"], SHA256, tmp_path)
+    assert status == "failed" and "Cannot download" in error
+    assert list((tmp_path / "s").iterdir()) == []
+
+
+def test_mirrors_are_tried_in_order(server, tmp_path):
+    urls = [f"{server}/missing", f"{server}/truncated", f"{server}/ok"]
+    assert download_source(urls, SHA256, tmp_path) == ("downloaded", None)
+    assert Handler.requests == ["/missing", "/truncated", "/ok"]
+
+
+def test_prefetch_downloads_each_archive_once(server, tmp_path):
+    results = prefetch_sources([([f"{server}/ok"], SHA256), ([f"{server}/ok"], SHA256.upper())], tmp_path)
+    assert results == {SHA256: ("downloaded", None)}
+    assert Handler.requests == ["/ok"]
@@ -0,0 +1,77 @@
+import json
+import os
+import stat
+
+from build_log import BuildLogs
+from build_report import RunReport
+from package_upload import UploadQueue
+
+
+def fake_conan(tmp_path, monkeypatch, rc: int = 0):
+    """A conan that records its arguments, keeps a copy of every --list file and exits with rc."""
+    (tmp_path / "lists").mkdir()
+    conan = tmp_path / "conan"
+    conan.write_text(
+        "#!/bin/sh\n"
+        f"echo \"$@\" >> {tmp_path}/calls\n"
+        "for arg; do case \"$arg\" in\n"
+        f"  --list=*) cp \"${{arg#--list=}}\" {tmp_path}/lists/ ;;\n"
+        "esac; done\n"
+        f"exit {rc}\n"
+    )
+    conan.chmod(conan.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+
+def package(name: str, package_id: str = "pid", prev: str | None = "prev") -> dict:
+    return {"ref": f"{name}/1.0#rrev", "package_id": package_id, "prev": prev}
+
+
+def calls(tmp_path) -> list[str]:
+    return (tmp_path / "calls").read_text().splitlines()
+
+
+def test_packages_upload_in_batches(tmp_path, monkeypatch):
+    fake_conan(tmp_path, monkeypatch)
+    report = RunReport()
+    queue = UploadQueue("origin", max_in_flight=1, batch_size=2, report=report, logs=BuildLogs(output="quiet"))
+    for name in ("a", "b", "c"):
+        queue.put(package(name), f"{name}/1.0 [default]")
+    queue.put(package("a", "pid2", "prev2"), "a/1.0 [cpp20]")
+    queue.put(package("d"), "d/1.0 [default]")
+    assert queue.close() == []
+
+    assert len(calls(tmp_path)) == 3
+    assert all(call.startswith("upload --list=") and call.endswith("-r=origin --confirm") for call in calls(tmp_path))
+    lists = {path.stem: json.loads(path.read_text())["Local Cache"] for path in (tmp_path / "lists").iterdir()}
+    assert sorted(lists) == ["batch-0", "batch-1", "batch-2"]
+    assert sorted(lists["batch-0"]) == ["a/1.0", "b/1.0"]
+    # Two binaries of one reference share its entry
+    assert lists["batch-1"]["a/1.0"]["revisions"]["rrev"]["packages"] == {
+        "pid2": {"revisions": {"prev2": {}}},
+    }
+    assert sorted(lists["batch-1"]) == ["a/1.0", "c/1.0"]
+    assert sorted(lists["batch-2"]) == ["d/1.0"]
+    # Every build of a batch gets the upload span
+    assert sum(1 for span in report.spans if span["phase"] == "upload") == 5
+
+
+def test_packages_without_revisions_upload_by_reference(tmp_path, monkeypatch):
+    fake_conan(tmp_path, monkeypatch)
+    queue = UploadQueue("origin", batch_size=4, logs=BuildLogs(output="quiet"))
+    queue.put(package("a", prev=None), "a/1.0 [default]")
+    queue.put(package("b"), "b/1.0 [default]")
+    assert queue.close() == []
+    uploaded = sorted(call.split()[1] for call in calls(tmp_path))
+    assert uploaded[0].startswith("--list=") and uploaded[1] == "a/1.0:*"
+    (batch,) = (tmp_path / "lists").iterdir()
+    assert list(json.loads(batch.read_text())["Local Cache"]) == ["b/1.0"]
+
+
+def test_failed_batches_report_their_builds(tmp_path, monkeypatch):
+    fake_conan(tmp_path, monkeypatch, rc=1)
+    queue = UploadQueue("origin", batch_size=2, logs=BuildLogs(output="quiet"))
+    for name in ("a", "b", "c"):
+        queue.put(package(name), f"{name}/1.0 [default]")
+    assert sorted(queue.close()) == ["a/1.0 [default]", "b/1.0 [default]", "c/1.0 [default]"]
+    assert len(calls(tmp_path)) == 2
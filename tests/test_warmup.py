@@ -0,0 +1,47 @@
+from conan_graph import build_order_items, plan_warmup
+
+
+def item(name: str, package_id: str, depends=(), binary: str = "Build") -> dict:
+    ref = f"{name}/1.0#rrev"
+    return {"ref": ref, "pref": f"{ref}:{package_id}", "depends": [f"{d}/1.0#rrev:{d[0]}1" for d in depends],
+            "binary": binary, "build_args": f"--requires={name}/1.0 --build={name}/1.0"}
+
+
+def cell(build_id: str) -> dict:
+    return {"build_id": build_id, "package": build_id.split("/")[0]}
+
+
+def test_build_order_keeps_only_binaries_to_build():
+    order = [[item("zlib", "z1"), item("bzip2", "b1", binary="Cache")], [item("boost", "b1", depends=["zlib"])]]
+    assert [i["pref"] for i in build_order_items(order)] == ["zlib/1.0#rrev:z1", "boost/1.0#rrev:b1"]
+
+
+def test_shared_binaries_are_built_once():
+    cells = [cell("a/1.0 [cpp17]"), cell("b/1.0 [cpp17]"), cell("a/1.0 [cpp20]")]
+    analysis = {
+        "a/1.0 [cpp17]": {"build_order": build_order_items([[item("zlib", "z1")], [item("boost", "b1", ["zlib"])]])},
+        "b/1.0 [cpp17]": {"build_order": build_order_items([[item("zlib", "z1")]])},
+        # A different package_id of the same recipe is a separate binary
+        "a/1.0 [cpp20]": {"build_order": build_order_items([[item("zlib", "z2")]])},
+    }
+    plan = plan_warmup(cells, analysis, {"a", "b"})
+    assert list(plan) == ["zlib/1.0#rrev:z1", "boost/1.0#rrev:b1", "zlib/1.0#rrev:z2"]
+    assert plan["zlib/1.0#rrev:z1"]["needed_by"] == ["a/1.0 [cpp17]", "b/1.0 [cpp17]"]
+    # The first cell needing a binary provides its profile and lockfile
+    assert plan["zlib/1.0#rrev:z1"]["cell"] is cells[0]
+    assert plan["boost/1.0#rrev:b1"]["depends"] == ["zlib/1.0#rrev:z1"]
+
+
+def test_local_packages_and_their_dependents_are_left_out():
+    cells = [cell("app/1.0 [cpp17]"), cell("tool/1.0 [cpp17]")]
+    analysis = {
+        "app/1.0 [cpp17]": {"build_order": build_order_items([
+            [item("zlib", "z1"), item("lib", "l1")],
+            [item("wrapper", "w1", ["lib"])],
+            [item("plugin", "p1", ["zlib", "wrapper"])],
+        ])},
+        # No build order (the graph could not be computed): nothing to warm up
+        "tool/1.0 [cpp17]": {"build_order": None},
+    }
+    plan = plan_warmup(cells, analysis, {"app", "tool", "lib"})
+    assert list(plan) == ["zlib/1.0#rrev:z1"]